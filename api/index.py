@@ -1,14 +1,42 @@
+import atexit
+import contextvars
 import datetime
+import functools
+import gzip
+import hashlib
 import io
+import json
+import logging
 import os
+import secrets
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+import warnings
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeout
 
-from flask import (Flask, Response, redirect, render_template, request,
-                   send_file)
+from flask import (Flask, Response, make_response, redirect, render_template,
+                   request)
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from PIL import Image, ImageFilter
+from limits.errors import ConfigurationError
+from limits.storage import Storage, storage_from_string
+from werkzeug.security import safe_join
+from PIL import Image, ImageChops, ImageFilter, ImageStat, UnidentifiedImageError
+# 只注册接受的输入格式；Image.open 指定 formats 后不会再触发 Image.init() 加载全部 40 多个插件
+from PIL import (BmpImagePlugin, GifImagePlugin, IcnsImagePlugin, IcoImagePlugin,
+                 JpegImagePlugin, PngImagePlugin, TiffImagePlugin, WebPImagePlugin)
 
-app = Flask(__name__, template_folder='../templates')
+try: import brotli
+except ImportError: brotli = None
+
+app = Flask(__name__, template_folder='../templates', static_folder=None)
 app.secret_key = os.environ.get('SECRET_KEY', 'global_ico_ultimate_final_v_full_lang')
 app.url_map.strict_slashes = False
 app.config['MAX_CONTENT_LENGTH'] = 4.5 * 1024 * 1024
@@ -16,20 +44,162 @@ app.config['MAX_CONTENT_LENGTH'] = 4.5 * 1024 * 1024
 # ==========================================
 # 1. 安全防护
 # ==========================================
+# 限流计数存储由 RATELIMIT_STORAGE_URI 决定：
+#   memory://                     单进程（默认）
+#   sqlite:///tmp/ratelimit.db    同一台机器上的多个进程共享
+#   redis://host:6379             跨节点共享（需要安装 redis）
+#   batched+<以上任一>             本地累积计数，每 RATELIMIT_FLUSH_INTERVAL 秒批量同步一次，请求路径上不再有网络往返
+class SQLiteStorage(Storage):
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        # 每个线程各开一个连接；:memory: 数据库不能跨连接共享，因此必须给出文件路径
+        self.path = uri.split('://', 1)[1]
+        if not self.path or self.path == ':memory:': raise ConfigurationError('sqlite:// needs a database file path, e.g. sqlite:///tmp/ratelimit.db; use memory:// for a single process')
+        self.local, self.writes = threading.local(), 0
+        self._db().execute('CREATE TABLE IF NOT EXISTS ratelimit (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expiry REAL NOT NULL)')
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self): return sqlite3.Error
+
+    def _db(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+        return db
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        # 单条 UPSERT 语句即一个原子窗口：过期则从 amount 重新计数，否则累加
+        now = time.time()
+        self.writes += 1
+        if self.writes % 1000 == 0: self._db().execute('DELETE FROM ratelimit WHERE expiry <= ?', (now,))
+        return self._db().execute(
+            'INSERT INTO ratelimit (key, value, expiry) VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET '
+            'value = CASE WHEN expiry <= ? THEN excluded.value ELSE value + excluded.value END, '
+            'expiry = CASE WHEN expiry <= ? THEN excluded.expiry ELSE expiry END RETURNING value',
+            (key, amount, now + expiry, now, now)).fetchone()[0]
+
+    def get(self, key):
+        row = self._db().execute('SELECT value FROM ratelimit WHERE key = ? AND expiry > ?', (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        row = self._db().execute('SELECT expiry FROM ratelimit WHERE key = ? AND expiry > ?', (key, time.time())).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        return self._db().execute('SELECT 1').fetchone() == (1,)
+
+    def reset(self):
+        return self._db().execute('DELETE FROM ratelimit').rowcount
+
+    def clear(self, key):
+        self._db().execute('DELETE FROM ratelimit WHERE key = ?', (key,))
+
+class BatchedStorage(Storage):
+    # 计数先在本地累积，到时间后批量写入后端；估算值 = 上次同步的后端值 + 本地未同步部分。
+    # 代价是每个节点最多在一个同步周期内超出限额
+    STORAGE_SCHEME = ["batched+memory", "batched+sqlite", "batched+redis", "batched+rediss", "batched+redis+sentinel", "batched+redis+cluster", "batched+memcached"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, flush_interval=1.0, **options):
+        self.backend = storage_from_string(uri.split('+', 1)[1], **options)
+        self.flush_interval, self.flushed_at = float(flush_interval), time.monotonic()
+        self.pending, self.synced, self.lock = {}, {}, threading.Lock()
+        atexit.register(self.flush)
+        super().__init__(uri, wrap_exceptions=wrap_exceptions)
+
+    @property
+    def base_exceptions(self): return self.backend.base_exceptions
+
+    def _synced(self, key, expiry=None):
+        # 上次同步的后端计数；本地没有或窗口已过期时向后端查询一次。
+        # 后端没有这个键（计数为 0）时直接在本地开一个 now + expiry 的新窗口，不拿后端返回的过期时间和本地时钟比较
+        now = time.time()
+        value, expires = self.synced.get(key, (0, 0.0))
+        if expires <= now:
+            value = self.backend.get(key)
+            if expiry is None: expiry = self.pending.get(key, (0, self.flush_interval))[1]
+            expires = self.backend.get_expiry(key) if value else now + expiry
+            self.synced[key] = (value, expires)
+        return value
+
+    def flush(self):
+        with self.lock: pending, self.pending, self.flushed_at = self.pending, {}, time.monotonic()
+        for key, (amount, expiry) in pending.items():
+            value = self.backend.incr(key, expiry, amount=amount)
+            with self.lock: self.synced[key] = (value, self.backend.get_expiry(key))
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        with self.lock:
+            pending = self.pending.get(key, (0, expiry))[0] + amount
+            self.pending[key] = (pending, expiry)
+            value = self._synced(key, expiry) + pending
+            due = time.monotonic() - self.flushed_at >= self.flush_interval
+        if due: self.flush()
+        return value
+
+    def get(self, key):
+        with self.lock: return self._synced(key) + self.pending.get(key, (0, 0))[0]
+
+    def get_expiry(self, key):
+        with self.lock:
+            self._synced(key)
+            return self.synced[key][1]
+
+    def check(self):
+        return self.backend.check()
+
+    def reset(self):
+        with self.lock: self.pending, self.synced = {}, {}
+        return self.backend.reset()
+
+    def clear(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+            self.synced.pop(key, None)
+        self.backend.clear(key)
+
+RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', 'memory://')
 limiter = Limiter(
     get_remote_address,
     app=app,
     default_limits=["300 per day", "60 per hour"],
-    storage_uri="memory://"
+    storage_uri=RATELIMIT_STORAGE_URI,
+    storage_options={'flush_interval': float(os.environ.get('RATELIMIT_FLUSH_INTERVAL', 1))} if RATELIMIT_STORAGE_URI.startswith('batched+') else {},
 )
 
 # ==========================================
 # 2. 图像处理：智能描边
 # ==========================================
+@functools.lru_cache(maxsize=None)
+def numpy():
+    # numpy 导入约需 70ms，推迟到第一次描边时再加载；未安装时返回 None
+    try: import numpy
+    except ImportError: return None
+    return numpy
+
 def add_smart_glow(img):
     if img.mode != 'RGBA': return img.convert('RGBA')
-    r, g, b, a = img.split()
+    a = img.getchannel('A')
     if a.getextrema()[0] > 250: return img
+    np = numpy()
+    if np is None: return _add_smart_glow_legacy(img, a)
+    # 描边层颜色恒为白色，只需计算 alpha：四个方向平移后的 alpha 依次按 alpha_composite 的整数公式叠加
+    mask = np.asarray(a, dtype=np.uint16)
+    ink = (mask * 80 + 128 + ((mask * 80 + 128) >> 8)) >> 8
+    halo = np.zeros_like(ink)
+    for dy, dx in [(0, 1), (0, -1), (1, 0), (-1, 0)]:
+        src = np.zeros_like(ink)
+        src[max(dy, 0):ink.shape[0] + min(dy, 0), max(dx, 0):ink.shape[1] + min(dx, 0)] = ink[max(-dy, 0):ink.shape[0] - max(dy, 0), max(-dx, 0):ink.shape[1] - max(dx, 0)]
+        halo = src * 255 + halo * (255 - src) + 128
+        halo = ((halo >> 8) + halo) >> 8
+    white = Image.new('L', img.size, 255)
+    glow = Image.merge('RGBA', (white, white, white, Image.fromarray(halo.astype(np.uint8), 'L')))
+    return Image.alpha_composite(glow, img)
+
+def _add_smart_glow_legacy(img, a):
     glow = Image.new('RGBA', img.size, (255, 255, 255, 0))
     for offset in [(1,0), (-1,0), (0,1), (0,-1)]:
         temp = Image.new('RGBA', img.size, (0,0,0,0))
@@ -37,407 +207,893 @@ def add_smart_glow(img):
         glow = Image.alpha_composite(glow, temp)
     return Image.alpha_composite(glow, img)
 
+# ICO 单帧最大 256x256；多尺寸请求共用一次解码，并按从大到小逐级缩放
+MAX_ICO_SIZE = 256
+MAX_SIZES_PER_REQUEST = 8
+
+def normalize_sizes(values):
+    sizes = sorted({int(v) for v in values} or {32}, reverse=True)
+    if sizes[0] > MAX_ICO_SIZE or sizes[-1] < 1 or len(sizes) > MAX_SIZES_PER_REQUEST: raise ValueError(f"Invalid sizes: {sizes}")
+    return sizes
+
+def parse_sizes(form, fmt='ico'):
+    # 兼容旧的单值 size 字段，同时支持 sizes=16,32,48 或多个 size 字段
+    # 完整套件的尺寸是固定的，忽略表单中的 sizes，避免同一套件按不同 sizes 在缓存中重复存放
+    if fmt == 'package': return list(PACKAGE_ICO_SIZES)
+    return normalize_sizes(v.strip() for field in ('sizes', 'size') for item in form.getlist(field) for v in item.split(',') if v.strip())
+
+RESAMPLE_FILTERS = {
+    'lanczos': Image.Resampling.LANCZOS, 'bicubic': Image.Resampling.BICUBIC, 'hamming': Image.Resampling.HAMMING,
+    'bilinear': Image.Resampling.BILINEAR, 'box': Image.Resampling.BOX, 'nearest': Image.Resampling.NEAREST,
+}
+
+def parse_options(form):
+    resample, encoding = form.get('resample', 'auto'), form.get('encoding', 'png')
+    if resample != 'auto' and resample not in RESAMPLE_FILTERS: raise ValueError(f"Invalid resample: {resample}")
+    if encoding not in ICO_ENCODINGS: raise ValueError(f"Invalid encoding: {encoding}")
+    return {'resample': resample, 'encoding': encoding, 'palette': form.get('palette', '0') in ('1', 'true', 'on'), 'frame': parse_frame(form.get('frame', 'auto'))}
+
+def resize_square(img, size, resample='auto'):
+    # auto：尺寸相同直接复用；正方形整数倍缩小用 reduce（区域平均，像素画不会糊）；整数倍放大用 NEAREST 保持像素边缘
+    if img.size == (size, size): return img
+    if resample != 'auto': return img.resize((size, size), RESAMPLE_FILTERS[resample])
+    if img.width == img.height and img.width % size == 0: return img.reduce(img.width // size)
+    if img.width == img.height and size % img.width == 0: return img.resize((size, size), Image.Resampling.NEAREST)
+    return img.resize((size, size), Image.Resampling.LANCZOS)
+
+def build_pyramid(img, sizes, resample='auto'):
+    # 最大尺寸从原图缩放，之后每一级都从上一级结果缩放，总开销接近一次 resize
+    frames = []
+    with stage('resize', f"{img.width}x{img.height}"):
+        for size in sorted(sizes, reverse=True):
+            img = resize_square(img, size, resample)
+            frames.append(img)
+    return frames
+
+# ICO 每个条目可以是 PNG 或 BMP(DIB) 负载：
+#   png   全部 PNG（与 Pillow 默认输出一致）
+#   bmp   全部 32 位 BMP + AND 掩码，兼容最老的读取器
+#   auto  每个条目取 PNG 与 BMP 中较小的一个
+# 默认 png：tools/bench.py --encodings 显示缩放后的图标几乎总是 PNG 更小，auto 只多花编码时间
+# palette=True 时额外尝试无损 8 位调色板 PNG；部分读取器（包括 Pillow 的 ICO 解码器）会丢失其透明度，所以默认关闭
+ICO_ENCODINGS = ('png', 'bmp', 'auto')
+ENCODE_STATS = {'entries': 0, 'bytes_out': 0, 'bytes_saved': 0, 'png': 0, 'png8': 0, 'bmp': 0}
+_encode_counts = contextvars.ContextVar('encode_counts', default=None)
+
+def _png_payload(frame, **params):
+    stream = io.BytesIO()
+    frame.save(stream, format='PNG', **params)
+    return stream.getvalue()
+
+def _png8_payload(frame):
+    # 颜色数（含 alpha）不超过 256 时转调色板；只有能逐像素还原时才采用，保证无损
+    colors = frame.getcolors(256)
+    if colors is None: return None
+    palette = frame.quantize(len(colors), method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    if palette.convert('RGBA').tobytes() != frame.tobytes(): return None
+    return _png_payload(palette, optimize=True)
+
+def _bmp_payload(frame):
+    # BITMAPINFOHEADER 的高度是 XOR 图 + AND 掩码的总高度；像素与掩码都自下而上存储，掩码每行按 4 字节对齐
+    w, h = frame.size
+    mask = frame.getchannel('A').point(lambda a: 255 if a == 0 else 0).convert('1')
+    and_mask = mask.tobytes('raw', '1', (w + 31) // 32 * 4, -1)
+    pixels = frame.tobytes('raw', 'BGRA', 0, -1)
+    return struct.pack('<IiiHHIIiiII', 40, w, h * 2, 1, 32, 0, len(pixels) + len(and_mask), 0, 0, 0, 0) + pixels + and_mask
+
+def encode_entry(frame, encoding='png', palette=False):
+    # 返回 (负载类型, 负载, 纯 PNG 时的大小)
+    png = _png_payload(frame)
+    if encoding == 'bmp': return 'bmp', _bmp_payload(frame), len(png)
+    candidates = [('png', png)]
+    if palette: candidates.append(('png8', _png8_payload(frame)))
+    if encoding == 'auto': candidates.append(('bmp', _bmp_payload(frame)))
+    kind, payload = min((c for c in candidates if c[1] is not None), key=lambda c: len(c[1]))
+    return kind, payload, len(png)
+
+def encode_ico(frames, encoding='png', palette=False):
+    with stage('encode', encoding + ('+palette' if palette else '')):
+        entries = [encode_entry(f.convert('RGBA') if f.mode != 'RGBA' else f, encoding, palette) for f in frames]
+        header = struct.pack('<HHH', 0, 1, len(frames))
+        offset = len(header) + 16 * len(frames)
+        directory, payloads = [], []
+        for frame, (kind, payload, _) in zip(frames, entries):
+            w, h = frame.size
+            directory.append(struct.pack('<BBBBHHII', w % 256, h % 256, 0, 0, 1, 32, len(payload), offset))
+            payloads.append(payload)
+            offset += len(payload)
+        data = b''.join([header, *directory, *payloads])
+    delta = dict.fromkeys(ENCODE_STATS, 0)
+    for kind, payload, png_size in entries:
+        delta['entries'] += 1
+        delta[kind] += 1
+        delta['bytes_saved'] += png_size - len(payload)
+    delta['bytes_out'] = len(data)
+    # 进程池子进程中先累积到 _timed_job 设置的字典里，随结果带回父进程再计入 ENCODE_STATS
+    pending = _encode_counts.get()
+    if pending is None: add_encode_stats(delta)
+    else:
+        for key, n in delta.items(): pending[key] = pending.get(key, 0) + n
+    return data
+
+def add_encode_stats(delta):
+    with _stats_lock:
+        for key, n in delta.items(): ENCODE_STATS[key] += n
+
+# 解码前按文件头尺寸拒绝超大图片（解压炸弹）；JPEG 用 draft 在解码器内缩小，其它格式先做整数倍 reduce
+MAX_INPUT_PIXELS = 40_000_000
+ACCEPTED_FORMATS = ('PNG', 'JPEG', 'GIF', 'WEBP', 'BMP', 'ICO', 'ICNS', 'TIFF')
+REDUCING_GAP = 2.0
+
+class ImageTooLarge(ValueError):
+    pass
+
+# Pillow 在 open 时自带解压炸弹检查：超过 MAX_IMAGE_PIXELS 发出警告，超过两倍直接抛 DecompressionBombError。
+# 阈值与 MAX_INPUT_PIXELS 对齐，警告区间交给 check_dimensions 拒绝，错误统一转换为 ImageTooLarge
+Image.MAX_IMAGE_PIXELS = MAX_INPUT_PIXELS
+warnings.filterwarnings('ignore', category=Image.DecompressionBombWarning)
+
+def check_dimensions(img):
+    if img.width * img.height > MAX_INPUT_PIXELS: raise ImageTooLarge(f"Image too large: {img.width}x{img.height}")
+
+def open_image(fp):
+    try: img = Image.open(fp, formats=ACCEPTED_FORMATS)
+    except Image.DecompressionBombError as e: raise ImageTooLarge(str(e)) from None
+    check_dimensions(img)
+    return img
+
+def sniff_image(stream):
+    # 只解析文件头，然后把流倒回开头。此时 Werkzeug 已经接收并缓存了整个 multipart 请求体，
+    # 这里省下的是哈希和解码：非图片或尺寸超限的上传在计算哈希、解码像素之前就被拒绝
+    with stage('sniff'):
+        img = open_image(stream)
+        stream.seek(0)
+    return img.format
+
+def is_opaque(img):
+    # 在转换为 RGBA 之前判断：无 alpha 通道且无透明色的模式必然不透明，有 alpha 的只看极值
+    if 'transparency' in img.info: return False
+    if img.mode in ('RGBA', 'LA', 'PA'): return img.getchannel('A').getextrema()[0] > 250
+    return img.mode not in ('RGBa', 'La')
+
+def prepare_image(img, target):
+    # 返回 (RGBA 图像, 是否完全不透明)
+    with stage('decode', f"{img.format or img.mode} {img.width}x{img.height}"):
+        work = int(target * REDUCING_GAP)
+        img.draft('RGB' if img.mode == 'RGB' else img.mode, (work, work))
+        img.load()
+        opaque = is_opaque(img)
+        if img.mode != "RGBA": img = img.convert("RGBA")
+        factor = min(img.width, img.height) // work
+        if factor >= 2: img = img.reduce(factor)
+    return img, opaque
+
+# 多帧输入的帧选择（表单字段 frame）：
+#   auto      动画 / 多页图片取第一帧；ICO / ICNS 为每个目标尺寸选最接近的内嵌尺寸，尺寸相同则原样复用（不重采样、不描边）
+#   <数字>    指定帧或页（ICO / ICNS 中按内嵌尺寸从大到小编号）
+#   largest   像素面积最大的帧（ICO / ICNS 即最大的内嵌尺寸，等同旧行为）
+#   sharpest  边缘能量最高的帧，需要逐帧解码，最多检查 FRAME_SCAN_LIMIT 帧
+# 只 seek 到需要的帧，之后的帧不会被解码；注意 GIF / WebP 的 seek(n) 仍需解码之前的各帧
+FRAME_CHOICES = ('auto', 'largest', 'sharpest')
+SHARED_CANVAS = ('GIF', 'WEBP', 'PNG')  # 动画 GIF / WebP / APNG
+FRAME_SCAN_LIMIT = 64
+
+class InvalidFrame(ValueError):
+    pass
+
+def parse_frame(value):
+    # isdigit() 也接受 '²' 等 Unicode 数字，int() 却无法解析，因此只接受 ASCII 数字
+    if value in FRAME_CHOICES or (value.isascii() and value.isdigit()): return value
+    raise ValueError(f"Invalid frame: {value}")
+
+def embedded_entries(img):
+    # ICO / ICNS：{像素边长: 解码该条目的函数}；其它格式返回空字典。条目只在被选中时才解码
+    if img.format == 'ICO': return {max(size): functools.partial(img.ico.getimage, size) for size in img.ico.sizes()}
+    if img.format == 'ICNS': return {max(w, h) * scale: functools.partial(img.icns.getimage, (w, h, scale)) for w, h, scale in img.info['sizes']}
+    return {}
+
+def sharpness(img, side):
+    # 缩放到统一的 side×side 灰度图后求 FIND_EDGES 的均值，不同尺寸的候选才可比；透明区域按 alpha 加权，避免其下的杂色被算作细节
+    rgba = img.convert('RGBA')
+    gray = ImageChops.multiply(rgba.convert('L'), rgba.getchannel('A'))
+    if gray.size != (side, side): gray = gray.resize((side, side), Image.BOX)
+    return ImageStat.Stat(gray.filter(ImageFilter.FIND_EDGES)).mean[0]
+
+def select_frame(img, frame, target=256):
+    # 返回选中的帧：原图对象（已 seek 到位，尚未解码）或解码后的副本；target 为最大输出尺寸
+    side = min(target, 128)
+    entries = embedded_entries(img)
+    if entries:
+        sides = sorted(entries, reverse=True)
+        if frame == 'sharpest':
+            # 比目标尺寸小的内嵌条目只有在没有更大的条目时才参与比较，否则放大后必然发虚
+            candidates = [s for s in sides if s >= target] or sides
+            return max((entries[s]() for s in candidates[-FRAME_SCAN_LIMIT:]), key=lambda f: sharpness(f, side))
+        index = int(frame) if frame.isdigit() else 0
+        if index >= len(sides): raise InvalidFrame(f"Frame {index} out of range ({len(sides)} sizes)")
+        return entries[sides[index]]()
+    n_frames = getattr(img, 'n_frames', 1)
+    if frame.isdigit():
+        if int(frame) >= n_frames: raise InvalidFrame(f"Frame {frame} out of range ({n_frames} frames)")
+        img.seek(int(frame))
+    elif frame == 'largest' and img.format in SHARED_CANVAS:
+        # 动画的所有帧共用同一画布尺寸，而 seek(n) 要先解码之前的每一帧，直接取第一帧
+        img.seek(0)
+    elif frame == 'largest':
+        # TIFF 每页尺寸可以不同；seek 只读取各页的 IFD，不解码像素
+        areas = []
+        for index in range(min(n_frames, FRAME_SCAN_LIMIT)):
+            img.seek(index)
+            areas.append(img.width * img.height)
+        img.seek(areas.index(max(areas)))
+    elif frame == 'sharpest' and n_frames > 1:
+        best, best_score = None, -1.0
+        for index in range(min(n_frames, FRAME_SCAN_LIMIT)):
+            img.seek(index)
+            check_dimensions(img)
+            score = sharpness(img, side)
+            if score > best_score: best, best_score = img.copy(), score
+        return best
+    check_dimensions(img)
+    return img
+
+def render_embedded(entries, sizes, glow=True, resample='auto'):
+    # 每个目标尺寸取不小于它的最小内嵌尺寸（都比它小时取最大的），同一条目只解码一次
+    available = sorted(entries)
+    chosen = {size: next((side for side in available if side >= size), available[-1]) for size in sizes}
+    decoded = {}
+    with stage('decode', f"{len(set(chosen.values()))}/{len(available)} entries"):
+        for side in set(chosen.values()):
+            img = entries[side]()
+            img.load()
+            decoded[side] = (img.convert('RGBA') if img.mode != 'RGBA' else img, is_opaque(img))
+    frames = []
+    for size in sorted(sizes, reverse=True):
+        img, opaque = decoded[chosen[size]]
+        # 尺寸完全一致的条目原样复用：它已经是成品图标，再描边会让每次重新导出都多一圈光晕
+        if img.size == (size, size):
+            frames.append(img)
+            continue
+        outline = glow and not opaque
+        # 与 render_frames 相同：放大时先描边再缩放，缩小时先缩放再描边
+        if outline and size > img.width:
+            with stage('glow'): img = add_smart_glow(img)
+            outline = False
+        with stage('resize'): img = resize_square(img, size, resample)
+        if outline:
+            with stage('glow'): img = add_smart_glow(img)
+        frames.append(img)
+    return frames
+
+def render_frames(source, sizes, glow=True, resample='auto', frame='auto'):
+    # source 可以是 bytes，也可以是可 seek 的文件对象（直接交给解码器，不再整体读入内存）
+    img = open_image(source if hasattr(source, 'read') else io.BytesIO(source))
+    if frame == 'auto':
+        entries = embedded_entries(img)
+        if entries: return render_embedded(entries, sizes, glow, resample)
+    with stage('frame', frame): img = select_frame(img, frame, max(sizes))
+    img, opaque = prepare_image(img, max(sizes))
+    if not glow or opaque: return build_pyramid(img, sizes, resample)
+    # 输出比原图小时先缩放再描边，避免在大图上做无用功，也让 1px 描边在小图标上可见
+    if max(sizes) < max(img.size):
+        frames = build_pyramid(img, sizes, resample)
+        with stage('glow'): return [add_smart_glow(f) for f in frames]
+    with stage('glow', f"{img.width}x{img.height}"): img = add_smart_glow(img)
+    return build_pyramid(img, sizes, resample)
+
+def render_ico(source, sizes, glow=True, resample='auto', encoding='png', palette=False, frame='auto'):
+    return encode_ico(render_frames(source, sizes, glow, resample, frame), encoding, palette)
+
+# 完整 favicon 套件：一次解码、共用同一个缩放金字塔，输出 ICO + PNG + manifest + HTML 片段的 ZIP
+PACKAGE_ICO_SIZES = (48, 32, 16)
+PACKAGE_PNGS = {'favicon-16x16.png': 16, 'favicon-32x32.png': 32, 'apple-touch-icon.png': 180, 'android-chrome-192x192.png': 192, 'android-chrome-512x512.png': 512}
+PACKAGE_HTML = """<link rel="icon" href="/favicon.ico" sizes="{ico_size}x{ico_size}" />
+<link rel="icon" type="image/png" sizes="32x32" href="/favicon-32x32.png" />
+<link rel="icon" type="image/png" sizes="16x16" href="/favicon-16x16.png" />
+<link rel="apple-touch-icon" sizes="180x180" href="/apple-touch-icon.png" />
+<link rel="manifest" href="/site.webmanifest" />
+"""
+
+def package_name(form, filename):
+    # manifest 的 name 不能为空（Chrome 的安装条件）：优先取表单字段 name，否则用上传文件名去掉扩展名
+    name = form.get('name', '').strip() or os.path.splitext(os.path.basename(filename or ''))[0].strip() or 'Favicon'
+    return name[:45]
+
+def render_package(source, sizes=PACKAGE_ICO_SIZES, glow=True, resample='auto', encoding='png', palette=False, frame='auto', name='Favicon'):
+    # sizes 为 favicon.ico 中的尺寸，PNG 的尺寸固定
+    sizes = sorted(set(sizes), reverse=True)
+    frames = {f.width: f for f in render_frames(source, sorted(set(sizes) | set(PACKAGE_PNGS.values()), reverse=True), glow, resample, frame)}
+    manifest = {
+        'name': name, 'short_name': name[:12].rstrip(),
+        'icons': [{'src': f'/android-chrome-{s}x{s}.png', 'sizes': f'{s}x{s}', 'type': 'image/png'} for s in (192, 512)],
+        'theme_color': '#ffffff', 'background_color': '#ffffff', 'display': 'standalone',
+    }
+    output_stream = io.BytesIO()
+    with zipfile.ZipFile(output_stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('favicon.ico', encode_ico([frames[s] for s in sizes], encoding, palette))
+        with stage('encode_png'):
+            for filename, size in PACKAGE_PNGS.items():
+                png_stream = io.BytesIO()
+                frames[size].save(png_stream, format='PNG', optimize=True)
+                archive.writestr(filename, png_stream.getvalue())
+        archive.writestr('site.webmanifest', json.dumps(manifest, ensure_ascii=False, indent=2))
+        archive.writestr('favicon.html', PACKAGE_HTML.format(ico_size=sizes[0]))
+    return output_stream.getvalue()
+
+def convert_image(source, sizes=(32,), glow=True, resample='auto', encoding='png', palette=False, frame='auto'):
+    # 库接口：bytes / 路径 / 文件对象 → ICO bytes，不经过 Flask 路由、缓存与限流
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f: source = f.read()
+    elif hasattr(source, 'read'): source = source.read()
+    return render_ico(source, normalize_sizes(sizes), glow, resample, encoding, palette, parse_frame(str(frame)))
+
 # ==========================================
-# 3. 终极全球语言包 (22语言全量翻译 - 无省略)
+# 3. 监控：分阶段计时、Server-Timing 与 Prometheus 指标
 # ==========================================
-TRANSLATIONS = {
-    # 1. English
-    'en': {
-        'name': 'English', 'dir': 'ltr', 'recommend': 'Recommended', 'badge': 'HOT',
-        'seo_title': 'Free Online ICO Converter - Create Transparent Favicon',
-        'seo_desc': 'Best free online ICO converter. Convert PNG, JPG to ICO format instantly.',
-        'keywords': 'ico converter, favicon generator',
-        'h1': 'ICO Converter', 'subtitle': 'Professional Favicon Generator',
-        'upload_label': 'Click to upload or Drag image', 'size_label': 'Target Size', 'btn_submit': 'Generate ICO',
-        'footer': 'Securely processed. Privacy protected.', 'error_large': 'File too large',
-        'tab_create': 'Create', 'tab_guide': 'Guide',
-        'guide_preview_title': 'Visual Preview', 'guide_preview_desc': 'Your icon will be displayed in browser tabs.',
-        'step1_title': 'Upload to Server', 'step1_desc': 'Upload favicon.ico to your website root directory.', 'step1_file_path': '/root/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'Update HTML', 'step2_desc': 'Paste this code into the <head> section.',
-        'guide_copy_btn': 'Copy', 'guide_copied': 'Copied!',
-        'faq_title': 'FAQ', 'share_title': 'Share', 'share_modal_title': 'Share with Friends', 'share_copy_label': 'Copy Link', 'share_msg': 'Check out this ICO converter:',
-        'faq_list': [
-            {'q': 'What is a Favicon?', 'a': 'A small icon displayed in browser tabs.'},
-            {'q': 'Transparent backgrounds?', 'a': 'Yes, we preserve transparency.'},
-            {'q': 'Best size?', 'a': '32x32 is standard for desktop.'},
-            {'q': 'Is it safe?', 'a': 'Yes, images are not saved.'}
-        ]
-    },
-    # 2. Simplified Chinese
-    'zh': {
-        'name': '简体中文', 'dir': 'ltr', 'recommend': '推荐', 'badge': '常用',
-        'seo_title': '在线 ICO 图标生成器 - 免费制作透明 Favicon',
-        'seo_desc': '免费在线图片转 ICO 工具。支持透明背景。',
-        'keywords': 'ICO生成器, favicon制作',
-        'h1': 'ICO 图标生成器', 'subtitle': '一键生成透明背景图标',
-        'upload_label': '点击选择 或 拖拽图片', 'size_label': '目标尺寸', 'btn_submit': '生成并下载 .ICO',
-        'footer': '数据安全保护，不保存任何图片。', 'error_large': '文件过大',
-        'tab_create': '制作图标', 'tab_guide': '使用指南',
-        'guide_preview_title': '效果预览', 'guide_preview_desc': '图标将显示在浏览器标签页中。',
-        'step1_title': '上传至服务器', 'step1_desc': '将 favicon.ico 上传到网站根目录。', 'step1_file_path': '/根目录/', 'step1_file_name': 'favicon.ico',
-        'step2_title': '引入 HTML', 'step2_desc': '将代码粘贴到 <head> 标签之间。',
-        'guide_copy_btn': '复制', 'guide_copied': '已复制!',
-        'faq_title': '常见问题', 'share_title': '分享工具', 'share_modal_title': '分享给朋友', 'share_copy_label': '复制链接', 'share_msg': '推荐这个好用的 ICO 工具：',
-        'faq_list': [
-            {'q': '什么是 Favicon？', 'a': '浏览器标签页上的小图标。'},
-            {'q': '支持透明吗？', 'a': '支持，完美保留透明背景。'},
-            {'q': '最佳尺寸？', 'a': 'PC 端推荐 32x32。'},
-            {'q': '安全吗？', 'a': '绝对安全，不保存文件。'}
-        ]
-    },
-    # 3. Traditional Chinese
-    'tw': {
-        'name': '繁體中文', 'dir': 'ltr', 'recommend': '推薦', 'badge': '常用',
-        'seo_title': '線上 ICO 圖示產生器 - 製作透明 Favicon',
-        'seo_desc': '免費線上圖片轉 ICO 工具。支援透明背景。',
-        'keywords': 'ICO產生器, favicon製作',
-        'h1': 'ICO 圖示產生器', 'subtitle': '一鍵生成透明背景圖示',
-        'upload_label': '點擊選擇 或 拖曳圖片', 'size_label': '目標尺寸', 'btn_submit': '產生並下載 .ICO',
-        'footer': '資料安全保護，不保存任何圖片。', 'error_large': '檔案過大',
-        'tab_create': '製作圖示', 'tab_guide': '使用指南',
-        'guide_preview_title': '效果預覽', 'guide_preview_desc': '圖示將顯示在瀏覽器分頁上。',
-        'step1_title': '上傳至伺服器', 'step1_desc': '將 favicon.ico 上傳到網站根目錄。', 'step1_file_path': '/根目錄/', 'step1_file_name': 'favicon.ico',
-        'step2_title': '引入 HTML', 'step2_desc': '將程式碼貼到 <head> 標籤之間。',
-        'guide_copy_btn': '複製', 'guide_copied': '已複製!',
-        'faq_title': '常見問題', 'share_title': '分享工具', 'share_modal_title': '分享給朋友', 'share_copy_label': '複製連結', 'share_msg': '推薦這個好用的 ICO 工具：',
-        'faq_list': [
-            {'q': '什麼是 Favicon？', 'a': '瀏覽器分頁上的小圖示。'},
-            {'q': '支援透明嗎？', 'a': '支援，完美保留透明背景。'},
-            {'q': '最佳尺寸？', 'a': 'PC 端推薦 32x32。'},
-            {'q': '安全嗎？', 'a': '絕對安全，不儲存檔案。'}
-        ]
-    },
-    # 4. Spanish
-    'es': {
-        'name': 'Español', 'dir': 'ltr', 'recommend': 'Recomendado', 'badge': 'HOT',
-        'seo_title': 'Convertidor ICO Online', 'seo_desc': 'Imágenes a ICO gratis.', 'keywords': 'convertidor ico',
-        'h1': 'Convertidor ICO', 'subtitle': 'Generador de Favicon',
-        'upload_label': 'Clic para subir', 'size_label': 'Tamaño', 'btn_submit': 'Generar .ICO',
-        'footer': 'Privacidad protegida.', 'error_large': 'Archivo grande',
-        'tab_create': 'Crear', 'tab_guide': 'Guía',
-        'guide_preview_title': 'Vista Previa', 'guide_preview_desc': 'Su icono aparecerá en las pestañas.',
-        'step1_title': 'Subir al Servidor', 'step1_desc': 'Sube favicon.ico al directorio raíz.', 'step1_file_path': '/raíz/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'Pega en la sección <head>.',
-        'guide_copy_btn': 'Copiar', 'guide_copied': '¡Copiado!',
-        'faq_title': 'Preguntas', 'share_title': 'Compartir', 'share_modal_title': 'Compartir', 'share_copy_label': 'Copiar', 'share_msg': 'Mira este convertidor ICO:',
-        'faq_list': [
-            {'q': '¿Qué es Favicon?', 'a': 'Icono en la pestaña del navegador.'},
-            {'q': '¿Transparencia?', 'a': 'Sí, la mantenemos.'},
-            {'q': '¿Tamaño?', 'a': '32x32 es estándar.'},
-            {'q': '¿Seguro?', 'a': 'Sí, no guardamos imágenes.'}
-        ]
-    },
-    # 5. French
-    'fr': {
-        'name': 'Français', 'dir': 'ltr', 'recommend': 'Recommandé', 'badge': 'TOP',
-        'seo_title': 'Convertisseur ICO', 'seo_desc': 'Image en ICO gratuit.', 'keywords': 'convertisseur ico',
-        'h1': 'Convertisseur ICO', 'subtitle': 'Générateur de Favicon',
-        'upload_label': 'Uploader image', 'size_label': 'Taille', 'btn_submit': 'Générer .ICO',
-        'footer': 'Confidentialité.', 'error_large': 'Fichier volumineux',
-        'tab_create': 'Créer', 'tab_guide': 'Guide',
-        'guide_preview_title': 'Aperçu', 'guide_preview_desc': 'Icône dans les onglets.',
-        'step1_title': 'Mettre sur Serveur', 'step1_desc': 'Mettez favicon.ico à la racine.', 'step1_file_path': '/racine/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'Collez dans <head>.',
-        'guide_copy_btn': 'Copier', 'guide_copied': 'Copié!',
-        'faq_title': 'FAQ', 'share_title': 'Partager', 'share_modal_title': 'Partager', 'share_copy_label': 'Copier', 'share_msg': 'Convertisseur ICO génial :',
-        'faq_list': [
-            {'q': 'C\'est quoi Favicon ?', 'a': 'Icône d\'onglet.'},
-            {'q': 'Transparence ?', 'a': 'Oui, supportée.'},
-            {'q': 'Taille ?', 'a': '32x32 standard.'},
-            {'q': 'Sécurisé ?', 'a': 'Oui, pas de stockage.'}
-        ]
-    },
-    # 6. German
-    'de': {
-        'name': 'Deutsch', 'dir': 'ltr', 'recommend': 'Empfohlen', 'badge': 'TOP',
-        'seo_title': 'ICO Konverter', 'seo_desc': 'Bild zu ICO.', 'keywords': 'ico konverter',
-        'h1': 'ICO Konverter', 'subtitle': 'Favicon-Generator',
-        'upload_label': 'Bild hochladen', 'size_label': 'Größe', 'btn_submit': 'Herunterladen',
-        'footer': 'Datenschutz.', 'error_large': 'Zu groß',
-        'tab_create': 'Erstellen', 'tab_guide': 'Anleitung',
-        'guide_preview_title': 'Vorschau', 'guide_preview_desc': 'Icon im Browser-Tab.',
-        'step1_title': 'Hochladen', 'step1_desc': 'Laden Sie favicon.ico ins Stammverzeichnis.', 'step1_file_path': '/root/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'In <head> einfügen.',
-        'guide_copy_btn': 'Kopieren', 'guide_copied': 'Kopiert!',
-        'faq_title': 'FAQ', 'share_title': 'Teilen', 'share_modal_title': 'Teilen', 'share_copy_label': 'Kopieren', 'share_msg': 'Toller ICO Konverter:',
-        'faq_list': [
-            {'q': 'Was ist Favicon?', 'a': 'Symbol im Tab.'},
-            {'q': 'Transparenz?', 'a': 'Ja.'},
-            {'q': 'Größe?', 'a': '32x32 Standard.'},
-            {'q': 'Sicher?', 'a': 'Ja, keine Speicherung.'}
-        ]
-    },
-    # 7. Japanese
-    'ja': {
-        'name': '日本語', 'dir': 'ltr', 'recommend': '推奨', 'badge': '人気',
-        'seo_title': 'ICO変換ツール', 'seo_desc': 'ファビコン作成。', 'keywords': 'ico 変換',
-        'h1': 'ICO 変換ツール', 'subtitle': 'プロフェッショナル作成',
-        'upload_label': 'アップロード', 'size_label': 'サイズ', 'btn_submit': 'ダウンロード',
-        'footer': 'プライバシー保護。', 'error_large': 'ファイル過大',
-        'tab_create': '作成', 'tab_guide': 'ガイド',
-        'guide_preview_title': 'プレビュー', 'guide_preview_desc': 'ブラウザのタブに表示されます。',
-        'step1_title': 'アップロード', 'step1_desc': 'ルートディレクトリに配置。', 'step1_file_path': '/ルート/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': '<head> 内に貼り付け。',
-        'guide_copy_btn': 'コピー', 'guide_copied': '完了!',
-        'faq_title': 'FAQ', 'share_title': 'シェア', 'share_modal_title': 'シェアする', 'share_copy_label': 'コピー', 'share_msg': '便利なICO変換ツール:',
-        'faq_list': [
-            {'q': 'Faviconとは？', 'a': 'タブのアイコンです。'},
-            {'q': '透過？', 'a': 'はい、対応しています。'},
-            {'q': 'サイズ？', 'a': '32x32が標準です。'},
-            {'q': '安全？', 'a': 'はい、保存されません。'}
-        ]
-    },
-    # 8. Korean
-    'ko': {
-        'name': '한국어', 'dir': 'ltr', 'recommend': '추천', 'badge': '인기',
-        'seo_title': 'ICO 변환기', 'seo_desc': '파비콘 만들기.', 'keywords': 'ico 변환',
-        'h1': 'ICO 변환기', 'subtitle': '전문 파비콘 도구',
-        'upload_label': '업로드', 'size_label': '크기', 'btn_submit': '다운로드',
-        'footer': '개인정보 보호.', 'error_large': '파일 큼',
-        'tab_create': '제작', 'tab_guide': '가이드',
-        'guide_preview_title': '미리보기', 'guide_preview_desc': '브라우저 탭에 표시됩니다.',
-        'step1_title': '업로드', 'step1_desc': '루트 디렉토리에 업로드.', 'step1_file_path': '/루트/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': '<head> 섹션에 붙여넣기.',
-        'guide_copy_btn': '복사', 'guide_copied': '완료!',
-        'faq_title': 'FAQ', 'share_title': '공유', 'share_modal_title': '공유하기', 'share_copy_label': '링크 복사', 'share_msg': 'ICO 변환기 추천:',
-        'faq_list': [
-            {'q': '파비콘이란?', 'a': '탭 아이콘입니다.'},
-            {'q': '투명?', 'a': '네, 지원합니다.'},
-            {'q': '사이즈?', 'a': '32x32 표준.'},
-            {'q': '안전?', 'a': '네, 저장 안 함.'}
-        ]
-    },
-    # 9. Russian
-    'ru': {
-        'name': 'Русский', 'dir': 'ltr', 'recommend': 'Стандарт', 'badge': 'ХИТ',
-        'seo_title': 'Конвертер ICO', 'seo_desc': 'Создать Favicon.', 'keywords': 'ico конвертер',
-        'h1': 'Конвертер ICO', 'subtitle': 'Генератор иконок',
-        'upload_label': 'Загрузить', 'size_label': 'Размер', 'btn_submit': 'Скачать',
-        'footer': 'Конфиденциальность.', 'error_large': 'Файл большой',
-        'tab_create': 'Создать', 'tab_guide': 'Гид',
-        'guide_preview_title': 'Предпросмотр', 'guide_preview_desc': 'Иконка во вкладках.',
-        'step1_title': 'Загрузка', 'step1_desc': 'В корень сайта.', 'step1_file_path': '/root/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'Вставьте в <head>.',
-        'guide_copy_btn': 'Копия', 'guide_copied': 'Готово!',
-        'faq_title': 'Вопросы', 'share_title': 'Поделиться', 'share_modal_title': 'Поделиться', 'share_copy_label': 'Копировать', 'share_msg': 'ICO конвертер:',
-        'faq_list': [
-            {'q': 'Что это?', 'a': 'Иконка сайта.'},
-            {'q': 'Прозрачность?', 'a': 'Да.'},
-            {'q': 'Размер?', 'a': '32x32.'},
-            {'q': 'Безопасно?', 'a': 'Да.'}
-        ]
-    },
-    # 10. Italian
-    'it': {
-        'name': 'Italiano', 'dir': 'ltr', 'recommend': 'Consigliato', 'badge': 'TOP',
-        'seo_title': 'Convertitore ICO', 'seo_desc': 'Crea Favicon.', 'keywords': 'convertitore ico',
-        'h1': 'Convertitore ICO', 'subtitle': 'Generatore Favicon',
-        'upload_label': 'Carica', 'size_label': 'Dimensione', 'btn_submit': 'Scarica',
-        'footer': 'Privacy protetta.', 'error_large': 'Errore file',
-        'tab_create': 'Crea', 'tab_guide': 'Guida',
-        'guide_preview_title': 'Anteprima', 'guide_preview_desc': 'Icona nei tab.',
-        'step1_title': 'Carica', 'step1_desc': 'Nella root.', 'step1_file_path': '/root/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'Incolla in <head>.',
-        'guide_copy_btn': 'Copia', 'guide_copied': 'Fatto!',
-        'faq_title': 'FAQ', 'share_title': 'Condividi', 'share_modal_title': 'Condividi', 'share_copy_label': 'Copia', 'share_msg': 'Convertitore ICO:',
-        'faq_list': [{'q': 'Cos\'è?', 'a': 'Icona del browser.'}, {'q': 'Trasparenza?', 'a': 'Sì.'}, {'q': 'Misura?', 'a': '32x32.'}, {'q': 'Sicuro?', 'a': 'Sì.'}]
-    },
-    # 11. Portuguese
-    'pt': {
-        'name': 'Português', 'dir': 'ltr', 'recommend': 'Recomendado', 'badge': 'HOT',
-        'seo_title': 'Conversor ICO', 'seo_desc': 'Criar Favicon.', 'keywords': 'conversor ico',
-        'h1': 'Conversor ICO', 'subtitle': 'Gerador Favicon',
-        'upload_label': 'Subir', 'size_label': 'Tamanho', 'btn_submit': 'Baixar',
-        'footer': 'Seguro.', 'error_large': 'Erro',
-        'tab_create': 'Criar', 'tab_guide': 'Guia',
-        'guide_preview_title': 'Prévia', 'guide_preview_desc': 'Ícone nas abas.',
-        'step1_title': 'Upload', 'step1_desc': 'Para a raiz.', 'step1_file_path': '/raiz/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'No <head>.',
-        'guide_copy_btn': 'Copiar', 'guide_copied': 'Copiado!',
-        'faq_title': 'FAQ', 'share_title': 'Compartilhar', 'share_modal_title': 'Compartilhar', 'share_copy_label': 'Copiar', 'share_msg': 'Conversor ICO:',
-        'faq_list': [{'q': 'O que é?', 'a': 'Ícone de aba.'}, {'q': 'Transparência?', 'a': 'Sim.'}, {'q': 'Tamanho?', 'a': '32x32.'}, {'q': 'Seguro?', 'a': 'Sim.'}]
-    },
-    # 12. Dutch
-    'nl': {
-        'name': 'Nederlands', 'dir': 'ltr', 'recommend': 'Aanbevolen', 'badge': 'TOP',
-        'seo_title': 'ICO Converter', 'seo_desc': 'Favicon maken.', 'keywords': 'ico converter',
-        'h1': 'ICO Converter', 'subtitle': 'Favicon Generator',
-        'upload_label': 'Uploaden', 'size_label': 'Grootte', 'btn_submit': 'Downloaden',
-        'footer': 'Privacy.', 'error_large': 'Fout',
-        'tab_create': 'Maken', 'tab_guide': 'Gids',
-        'guide_preview_title': 'Voorbeeld', 'guide_preview_desc': 'Icoon in tabs.',
-        'step1_title': 'Uploaden', 'step1_desc': 'Naar root.', 'step1_file_path': '/root/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'In <head>.',
-        'guide_copy_btn': 'Kopie', 'guide_copied': 'Klaar!',
-        'faq_title': 'FAQ', 'share_title': 'Delen', 'share_modal_title': 'Delen', 'share_copy_label': 'Kopiëren', 'share_msg': 'Check ICO Converter:',
-        'faq_list': [{'q': 'Wat is het?', 'a': 'Tab icoon.'}, {'q': 'Transparant?', 'a': 'Ja.'}, {'q': 'Grootte?', 'a': '32x32.'}, {'q': 'Veilig?', 'a': 'Ja.'}]
-    },
-    # 13. Polish
-    'pl': {
-        'name': 'Polski', 'dir': 'ltr', 'recommend': 'Zalecane', 'badge': 'HIT',
-        'seo_title': 'Konwerter ICO', 'seo_desc': 'Generator Favicon.', 'keywords': 'konwerter ico',
-        'h1': 'Konwerter ICO', 'subtitle': 'Generator Favicon',
-        'upload_label': 'Prześlij', 'size_label': 'Rozmiar', 'btn_submit': 'Pobierz',
-        'footer': 'Prywatność.', 'error_large': 'Błąd',
-        'tab_create': 'Stwórz', 'tab_guide': 'Info',
-        'guide_preview_title': 'Podgląd', 'guide_preview_desc': 'Ikona w kartach.',
-        'step1_title': 'Prześlij', 'step1_desc': 'Do katalogu głównego.', 'step1_file_path': '/root/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'W <head>.',
-        'guide_copy_btn': 'Kopiuj', 'guide_copied': 'Gotowe!',
-        'faq_title': 'FAQ', 'share_title': 'Udostępnij', 'share_modal_title': 'Udostępnij', 'share_copy_label': 'Kopiuj', 'share_msg': 'Konwerter ICO:',
-        'faq_list': [{'q': 'Co to?', 'a': 'Ikona strony.'}, {'q': 'Przezroczyste?', 'a': 'Tak.'}, {'q': 'Rozmiar?', 'a': '32x32.'}, {'q': 'Bezpieczne?', 'a': 'Tak.'}]
-    },
-    # 14. Swedish
-    'sv': {
-        'name': 'Svenska', 'dir': 'ltr', 'recommend': 'Standard', 'badge': 'TOP',
-        'seo_title': 'ICO Konverterare', 'seo_desc': 'Skapa Favicon.', 'keywords': 'ico konverterare',
-        'h1': 'ICO Konverterare', 'subtitle': 'Favicon Generator',
-        'upload_label': 'Ladda upp', 'size_label': 'Storlek', 'btn_submit': 'Ladda ner',
-        'footer': 'Säker.', 'error_large': 'Fel',
-        'tab_create': 'Skapa', 'tab_guide': 'Guide',
-        'guide_preview_title': 'Förhandsvisning', 'guide_preview_desc': 'Ikon i flikar.',
-        'step1_title': 'Ladda upp', 'step1_desc': 'Till rot.', 'step1_file_path': '/rot/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'I <head>.',
-        'guide_copy_btn': 'Kopiera', 'guide_copied': 'Klart!',
-        'faq_title': 'FAQ', 'share_title': 'Dela', 'share_modal_title': 'Dela', 'share_copy_label': 'Kopiera', 'share_msg': 'ICO Konverterare:',
-        'faq_list': [{'q': 'Vad är det?', 'a': 'Webbplatsikon.'}, {'q': 'Genomskinlig?', 'a': 'Ja.'}, {'q': 'Storlek?', 'a': '32x32.'}, {'q': 'Säkert?', 'a': 'Ja.'}]
-    },
-    # 15. Ukrainian
-    'uk': {
-        'name': 'Українська', 'dir': 'ltr', 'recommend': 'Стандарт', 'badge': 'ХІТ',
-        'seo_title': 'Конвертер ICO', 'seo_desc': 'Створити Favicon.', 'keywords': 'ico конвертер',
-        'h1': 'Конвертер ICO', 'subtitle': 'Генератор іконок',
-        'upload_label': 'Завантажити', 'size_label': 'Розмір', 'btn_submit': 'Завантажити',
-        'footer': 'Конфіденційність.', 'error_large': 'Помилка',
-        'tab_create': 'Створити', 'tab_guide': 'Інструкція',
-        'guide_preview_title': 'Перегляд', 'guide_preview_desc': 'Іконка у вкладках.',
-        'step1_title': 'Завантаження', 'step1_desc': 'У корінь.', 'step1_file_path': '/root/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'У <head>.',
-        'guide_copy_btn': 'Копія', 'guide_copied': 'Готово!',
-        'faq_title': 'FAQ', 'share_title': 'Поділитися', 'share_modal_title': 'Поділитися', 'share_copy_label': 'Копія', 'share_msg': 'ICO конвертер:',
-        'faq_list': [{'q': 'Що це?', 'a': 'Іконка сайту.'}, {'q': 'Прозорість?', 'a': 'Так.'}, {'q': 'Розмір?', 'a': '32x32.'}, {'q': 'Безпечно?', 'a': 'Так.'}]
-    },
-    # 16. Indonesian
-    'id': {
-        'name': 'Bahasa Indonesia', 'dir': 'ltr', 'recommend': 'Disarankan', 'badge': 'HOT',
-        'seo_title': 'Konverter ICO', 'seo_desc': 'Buat Favicon.', 'keywords': 'konverter ico',
-        'h1': 'Konverter ICO', 'subtitle': 'Pembuat Favicon',
-        'upload_label': 'Unggah', 'size_label': 'Ukuran', 'btn_submit': 'Unduh',
-        'footer': 'Aman.', 'error_large': 'Error',
-        'tab_create': 'Buat', 'tab_guide': 'Panduan',
-        'guide_preview_title': 'Pratinjau', 'guide_preview_desc': 'Ikon di tab.',
-        'step1_title': 'Unggah', 'step1_desc': 'Ke root.', 'step1_file_path': '/root/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'Di <head>.',
-        'guide_copy_btn': 'Salin', 'guide_copied': 'Disalin!',
-        'faq_title': 'FAQ', 'share_title': 'Bagikan', 'share_modal_title': 'Bagikan', 'share_copy_label': 'Salin', 'share_msg': 'Konverter ICO:',
-        'faq_list': [{'q': 'Apa itu?', 'a': 'Ikon web.'}, {'q': 'Transparan?', 'a': 'Ya.'}, {'q': 'Ukuran?', 'a': '32x32.'}, {'q': 'Aman?', 'a': 'Ya.'}]
-    },
-    # 17. Turkish
-    'tr': {
-        'name': 'Türkçe', 'dir': 'ltr', 'recommend': 'Önerilen', 'badge': 'POP',
-        'seo_title': 'ICO Dönüştürücü', 'seo_desc': 'Favicon yapma.', 'keywords': 'ico dönüştürücü',
-        'h1': 'ICO Dönüştürücü', 'subtitle': 'Favicon Oluşturucu',
-        'upload_label': 'Yükle', 'size_label': 'Boyut', 'btn_submit': 'İndir',
-        'footer': 'Gizlilik.', 'error_large': 'Hata',
-        'tab_create': 'Oluştur', 'tab_guide': 'Rehber',
-        'guide_preview_title': 'Önizleme', 'guide_preview_desc': 'Sekmelerde simge.',
-        'step1_title': 'Yükle', 'step1_desc': 'Kök dizine.', 'step1_file_path': '/kök/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': '<head>\'e.',
-        'guide_copy_btn': 'Kopyala', 'guide_copied': 'Tamam!',
-        'faq_title': 'SSS', 'share_title': 'Paylaş', 'share_modal_title': 'Paylaş', 'share_copy_label': 'Kopyala', 'share_msg': 'ICO Dönüştürücü:',
-        'faq_list': [{'q': 'Nedir?', 'a': 'Site simgesi.'}, {'q': 'Şeffaflık?', 'a': 'Evet.'}, {'q': 'Boyut?', 'a': '32x32.'}, {'q': 'Güvenli mi?', 'a': 'Evet.'}]
-    },
-    # 18. Vietnamese
-    'vi': {
-        'name': 'Tiếng Việt', 'dir': 'ltr', 'recommend': 'Đề xuất', 'badge': 'HOT',
-        'seo_title': 'Chuyển đổi ICO', 'seo_desc': 'Tạo Favicon.', 'keywords': 'chuyển đổi ico',
-        'h1': 'Chuyển đổi ICO', 'subtitle': 'Tạo Favicon',
-        'upload_label': 'Tải lên', 'size_label': 'Kích thước', 'btn_submit': 'Tải xuống',
-        'footer': 'Bảo mật.', 'error_large': 'Lỗi',
-        'tab_create': 'Tạo', 'tab_guide': 'H.dẫn',
-        'guide_preview_title': 'Xem trước', 'guide_preview_desc': 'Biểu tượng trên tab.',
-        'step1_title': 'Tải lên', 'step1_desc': 'Vào thư mục gốc.', 'step1_file_path': '/gốc/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'Vào <head>.',
-        'guide_copy_btn': 'Sao chép', 'guide_copied': 'Xong!',
-        'faq_title': 'Hỏi đáp', 'share_title': 'Chia sẻ', 'share_modal_title': 'Chia sẻ', 'share_copy_label': 'Sao chép', 'share_msg': 'Chuyển đổi ICO:',
-        'faq_list': [{'q': 'Là gì?', 'a': 'Biểu tượng web.'}, {'q': 'Trong suốt?', 'a': 'Có.'}, {'q': 'Kích thước?', 'a': '32x32.'}, {'q': 'An toàn?', 'a': 'Có.'}]
-    },
-    # 19. Thai
-    'th': {
-        'name': 'ไทย', 'dir': 'ltr', 'recommend': 'แนะนำ', 'badge': 'ฮิต',
-        'seo_title': 'ตัวแปลง ICO', 'seo_desc': 'สร้าง Favicon.', 'keywords': 'แปลงไฟล์ ico',
-        'h1': 'ตัวแปลง ICO', 'subtitle': 'สร้าง Favicon',
-        'upload_label': 'อัปโหลด', 'size_label': 'ขนาด', 'btn_submit': 'ดาวน์โหลด',
-        'footer': 'ปลอดภัย', 'error_large': 'ไฟล์ใหญ่',
-        'tab_create': 'สร้าง', 'tab_guide': 'คู่มือ',
-        'guide_preview_title': 'ตัวอย่าง', 'guide_preview_desc': 'ไอคอนบนแท็บ',
-        'step1_title': 'อัปโหลด', 'step1_desc': 'ไปที่ราก', 'step1_file_path': '/ราก/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'ใน <head>',
-        'guide_copy_btn': 'คัดลอก', 'guide_copied': 'สำเร็จ!',
-        'faq_title': 'FAQ', 'share_title': 'แชร์', 'share_modal_title': 'แชร์', 'share_copy_label': 'คัดลอก', 'share_msg': 'ตัวแปลง ICO:',
-        'faq_list': [{'q': 'คืออะไร?', 'a': 'ไอคอนเว็บ'}, {'q': 'โปร่งใส?', 'a': 'ใช่'}, {'q': 'ขนาด?', 'a': '32x32'}, {'q': 'ปลอดภัย?', 'a': 'ใช่'}]
-    },
-    # 20. Hindi
-    'hi': {
-        'name': 'हिन्दी', 'dir': 'ltr', 'recommend': 'अनुशंसित', 'badge': 'आम',
-        'seo_title': 'ICO कन्वर्टर', 'seo_desc': 'Favicon बनाएं.', 'keywords': 'ico converter',
-        'h1': 'ICO कन्वर्टर', 'subtitle': 'Favicon जनरेटर',
-        'upload_label': 'अपलोड', 'size_label': 'आकार', 'btn_submit': 'डाउनलोड',
-        'footer': 'सुरक्षित', 'error_large': 'बड़ी फ़ाइल',
-        'tab_create': 'बनाएं', 'tab_guide': 'गाइड',
-        'guide_preview_title': 'पूर्वावलोकन', 'guide_preview_desc': 'टैब में आइकन।',
-        'step1_title': 'अपलोड', 'step1_desc': 'रूट में।', 'step1_file_path': '/रूट/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': '<head> में।',
-        'guide_copy_btn': 'कॉपी', 'guide_copied': 'हो गया!',
-        'faq_title': 'FAQ', 'share_title': 'साझा', 'share_modal_title': 'साझा करें', 'share_copy_label': 'कॉपी', 'share_msg': 'ICO कन्वर्टर:',
-        'faq_list': [{'q': 'क्या है?', 'a': 'वेब आइकन।'}, {'q': 'पारदर्शी?', 'a': 'हाँ।'}, {'q': 'आकार?', 'a': '32x32'}, {'q': 'सुरक्षित?', 'a': 'हाँ।'}]
-    },
-    # 21. Arabic
-    'ar': {
-        'name': 'العربية', 'dir': 'rtl', 'recommend': 'موصى به', 'badge': 'شائع',
-        'seo_title': 'محول ICO', 'seo_desc': 'إنشاء أيقونة.', 'keywords': 'محول ico',
-        'h1': 'محول ICO', 'subtitle': 'مولد أيقونات',
-        'upload_label': 'رفع', 'size_label': 'الحجم', 'btn_submit': 'تحميل',
-        'footer': 'آمن.', 'error_large': 'خطأ',
-        'tab_create': 'إنشاء', 'tab_guide': 'دليل',
-        'guide_preview_title': 'معاينة', 'guide_preview_desc': 'أيقونة في التبويب.',
-        'step1_title': 'رفع', 'step1_desc': 'للجذر.', 'step1_file_path': '/جذر/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'في <head>.',
-        'guide_copy_btn': 'نسخ', 'guide_copied': 'تم!',
-        'faq_title': 'أسئلة', 'share_title': 'مشاركة', 'share_modal_title': 'مشاركة', 'share_copy_label': 'نسخ', 'share_msg': 'محول ICO:',
-        'faq_list': [{'q': 'ما هو؟', 'a': 'أيقونة الموقع.'}, {'q': 'شفاف؟', 'a': 'نعم.'}, {'q': 'الحجم؟', 'a': '32x32'}, {'q': 'آمن؟', 'a': 'نعم.'}]
-    },
-    # 22. Hebrew
-    'he': {
-        'name': 'עברית', 'dir': 'rtl', 'recommend': 'מומלץ', 'badge': 'נפוץ',
-        'seo_title': 'ממיר ICO', 'seo_desc': 'צור Favicon.', 'keywords': 'ממיר ico',
-        'h1': 'ממיר ICO', 'subtitle': 'יוצר אייקונים',
-        'upload_label': 'העלאה', 'size_label': 'גודל', 'btn_submit': 'הורד',
-        'footer': 'פרטיות.', 'error_large': 'שגיאה',
-        'tab_create': 'צור', 'tab_guide': 'מדריך',
-        'guide_preview_title': 'תצוגה', 'guide_preview_desc': 'אייקון בכרטיסייה.',
-        'step1_title': 'העלאה', 'step1_desc': 'לשורש.', 'step1_file_path': '/שורש/', 'step1_file_name': 'favicon.ico',
-        'step2_title': 'HTML', 'step2_desc': 'ב-<head>.',
-        'guide_copy_btn': 'העתק', 'guide_copied': 'בוצע!',
-        'faq_title': 'שאלות', 'share_title': 'שתף', 'share_modal_title': 'שתף', 'share_copy_label': 'העתק', 'share_msg': 'ממיר ICO:',
-        'faq_list': [{'q': 'מה זה?', 'a': 'אייקון אתר.'}, {'q': 'שקוף?', 'a': 'כן.'}, {'q': 'גודל?', 'a': '32x32'}, {'q': 'בטוח?', 'a': 'כן.'}]
-    }
-}
+logger = logging.getLogger('icon_maker')
+if not logger.handlers:
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+def log_event(event, level=logging.INFO, **fields):
+    logger.log(level, json.dumps({'event': event, **fields}, ensure_ascii=False, default=str))
+
+# 当前上下文的阶段记录列表；为 None 时 stage() 只是空操作，库调用方不需要关心
+_stage_records = contextvars.ContextVar('stage_records', default=None)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STAGE_HISTOGRAMS = {}
+SLOW_REQUEST_MS = float(os.environ.get('ICO_SLOW_MS', 1000))
+REQUEST_COUNTS = {}
+_metrics_lock = threading.Lock()
+
+@contextmanager
+def stage(name, desc=None):
+    records = _stage_records.get()
+    if records is None:
+        yield
+        return
+    started = time.perf_counter()
+    try: yield
+    finally: records.append((name, time.perf_counter() - started, desc))
+
+def record_stages(fn, *args):
+    # 在独立的记录列表中执行 fn，返回 (结果, 阶段记录)；进程池子进程中也使用它把记录带回父进程
+    token = _stage_records.set([])
+    try: return fn(*args), _stage_records.get()
+    finally: _stage_records.reset(token)
+
+def emit_stages(records):
+    # 有外层记录（请求级）时并入外层，由请求结束时统一上报；否则直接计入直方图
+    outer = _stage_records.get()
+    if outer is not None: outer.extend(records)
+    else: observe_stages(records)
+
+def observe_stages(records):
+    with _metrics_lock:
+        for name, seconds, _ in records:
+            hist = STAGE_HISTOGRAMS.setdefault(name, [[0] * len(STAGE_BUCKETS), 0, 0.0])
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if seconds <= bound: hist[0][i] += 1
+            hist[1] += 1
+            hist[2] += seconds
+
+def stage_totals(records):
+    # 同名阶段（如逐帧描边）合并为一项，描述取第一条
+    totals = OrderedDict()
+    for name, seconds, desc in records:
+        total, first_desc = totals.get(name, (0.0, desc))
+        totals[name] = (total + seconds, first_desc or desc)
+    return totals
+
+def server_timing(records):
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' + (f';desc="{desc}"' if desc else '') for name, (seconds, desc) in stage_totals(records).items())
+
+def stage_log(records):
+    return {name: {'ms': round(seconds * 1000, 2), 'desc': desc} if desc else {'ms': round(seconds * 1000, 2)} for name, (seconds, desc) in stage_totals(records).items()}
+
+def prometheus_metrics():
+    lines = ['# TYPE ico_stage_duration_seconds histogram']
+    with _metrics_lock:
+        for name, (buckets, n, total) in sorted(STAGE_HISTOGRAMS.items()):
+            lines += [f'ico_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {c}' for bound, c in zip(STAGE_BUCKETS, buckets)]
+            lines += [f'ico_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {n}', f'ico_stage_duration_seconds_sum{{stage="{name}"}} {total}', f'ico_stage_duration_seconds_count{{stage="{name}"}} {n}']
+        lines.append('# TYPE ico_requests_total counter')
+        lines += [f'ico_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}' for (endpoint, status), n in sorted(REQUEST_COUNTS.items())]
+    with _stats_lock:
+        lines.append('# TYPE ico_encode_entries_total counter')
+        lines += [f'ico_encode_entries_total{{payload="{k}"}} {ENCODE_STATS[k]}' for k in ('png', 'png8', 'bmp')]
+        lines += ['# TYPE ico_encode_bytes_total counter', f"ico_encode_bytes_total {ENCODE_STATS['bytes_out']}",
+                  '# TYPE ico_encode_bytes_saved_total counter', f"ico_encode_bytes_saved_total {ENCODE_STATS['bytes_saved']}"]
+        lines.append('# TYPE ico_cache_events_total counter')
+        lines += [f'ico_cache_events_total{{event="{k}"}} {v}' for k, v in sorted(CACHE_STATS.items())]
+        lines += ['# TYPE ico_worker_jobs_total counter', f"ico_worker_jobs_total {POOL_STATS['jobs']}",
+                  '# TYPE ico_worker_rejected_total counter', f"ico_worker_rejected_total {POOL_STATS['rejected']}",
+                  '# TYPE ico_job_rejected_total counter', f"ico_job_rejected_total {POOL_STATS['jobs_rejected']}",
+                  '# TYPE ico_worker_timeouts_total counter', f"ico_worker_timeouts_total {POOL_STATS['timeouts']}",
+                  '# TYPE ico_worker_in_flight gauge', f"ico_worker_in_flight {POOL_STATS['in_flight']}",
+                  '# TYPE ico_worker_wait_seconds_total counter', f"ico_worker_wait_seconds_total {POOL_STATS['wait_seconds']}",
+                  '# TYPE ico_worker_run_seconds_total counter', f"ico_worker_run_seconds_total {POOL_STATS['run_seconds']}"]
+    return '\n'.join(lines) + '\n'
+
+def count_request(endpoint, status):
+    with _metrics_lock: REQUEST_COUNTS[(endpoint, status)] = REQUEST_COUNTS.get((endpoint, status), 0) + 1
+
+# 视图函数名 → 指标中的 endpoint 标签。在 after_request 中计数：限流的 429 和上传过大的 413 在视图执行前就已返回，
+# 视图内计数会漏掉它们
+METRIC_ENDPOINTS = {'generate_ico': 'generate', 'generate_batch': 'batch', 'create_job': 'jobs'}
+
+@app.after_request
+def _count_request(response):
+    endpoint = METRIC_ENDPOINTS.get(request.endpoint)
+    if endpoint: count_request(endpoint, response.status_code)
+    return response
+
+# ==========================================
+# 4. 任务执行：默认在请求线程内执行，可切换为有界进程池
+# ==========================================
+POOL_STATS = {'jobs': 0, 'in_flight': 0, 'rejected': 0, 'jobs_rejected': 0, 'timeouts': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0, 'max_wait_seconds': 0.0}
+_stats_lock = threading.Lock()
+
+def count(stat, n=1, stats=None):
+    with _stats_lock: (CACHE_STATS if stats is None else stats)[stat] += n
+
+class QueueFull(RuntimeError):
+    pass
+
+class JobTimeout(RuntimeError):
+    pass
 
-SUPPORTED_LANGS = list(TRANSLATIONS.keys())
+def _timed_job(fn, args):
+    # 在子进程中执行；time.monotonic 在同一台机器的进程间可比较，用于计算排队时间
+    started = time.monotonic()
+    token = _encode_counts.set({})
+    try:
+        result, records = record_stages(fn, *args)
+        return result, records, _encode_counts.get(), started, time.monotonic()
+    finally: _encode_counts.reset(token)
+
+class ImageWorkers:
+    def __init__(self, mode, workers, queue_size, timeout):
+        self.mode, self.workers, self.timeout = mode, workers, timeout
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.pool, self.lock = None, threading.Lock()
+
+    def _pool(self):
+        with self.lock:
+            if self.pool is None: self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def run(self, fn, *args, block=False):
+        if self.mode != 'process':
+            started = time.monotonic()
+            result, records = record_stages(fn, *args)
+            self._record(0.0, time.monotonic() - started)
+            emit_stages(records)
+            return result
+        if not self.slots.acquire(blocking=block):
+            count('rejected', stats=POOL_STATS)
+            raise QueueFull("Image worker queue is full")
+        count('in_flight', stats=POOL_STATS)
+        submitted = time.monotonic()
+        try: future = self._pool().submit(_timed_job, fn, args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda f: self._release())
+        try: result, records, encoded, started, finished = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            count('timeouts', stats=POOL_STATS)
+            raise JobTimeout(f"Image job exceeded {self.timeout}s")
+        self._record(started - submitted, finished - started)
+        add_encode_stats(encoded)
+        emit_stages(records + [('queue', started - submitted, None)])
+        return result
+
+    def _release(self):
+        self.slots.release()
+        count('in_flight', -1, stats=POOL_STATS)
+
+    def _record(self, wait, run):
+        with _stats_lock:
+            POOL_STATS['jobs'] += 1
+            POOL_STATS['wait_seconds'] += wait
+            POOL_STATS['run_seconds'] += run
+            POOL_STATS['max_wait_seconds'] = max(POOL_STATS['max_wait_seconds'], wait)
+
+image_workers = ImageWorkers(
+    os.environ.get('ICO_EXECUTOR', 'inline'),
+    int(os.environ.get('ICO_WORKERS', os.cpu_count() or 2)),
+    int(os.environ.get('ICO_QUEUE_SIZE', 16)),
+    float(os.environ.get('ICO_JOB_TIMEOUT', 20)),
+)
+
+# ==========================================
+# 5. 结果缓存：按上传内容 + 参数寻址
+# ==========================================
+CACHE_VERSION = 7  # 输出算法变化时递增，旧缓存自动失效
+CACHE_STATS = {'hits': 0, 'misses': 0, 'evictions': 0, 'not_modified': 0}
+
+def cache_key(source, **options):
+    digest = hashlib.sha256()
+    if hasattr(source, 'read'):
+        for chunk in iter(lambda: source.read(1 << 16), b''): digest.update(chunk)
+        source.seek(0)
+    else: digest.update(source)
+    digest.update(repr((CACHE_VERSION, sorted(options.items()))).encode())
+    return digest.hexdigest()
+
+class MemoryCache:
+    def __init__(self, max_bytes):
+        self.max_bytes, self.used, self.items, self.lock = max_bytes, 0, OrderedDict(), threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None: self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes: return
+        with self.lock:
+            if key in self.items: self.used -= len(self.items.pop(key))
+            self.items[key] = value
+            self.used += len(value)
+            while self.used > self.max_bytes:
+                _, old = self.items.popitem(last=False)
+                self.used -= len(old)
+                count('evictions')
+
+class DiskCache:
+    # 本地目录存储，用文件 mtime 记录最近访问时间，超出容量时删除最旧的文件。
+    # 已用字节数记在内存里，首次写入时扫描一次目录；只有超出容量才重新扫描并淘汰到容量的 90%，
+    # 顺带校正其它进程写入造成的偏差
+    def __init__(self, path, max_bytes):
+        self.path, self.max_bytes, self.lock = path, max_bytes, threading.Lock()
+        self.used = None
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key): return os.path.join(self.path, key)
+
+    def get(self, key):
+        try:
+            with open(self._file(key), 'rb') as f: value = f.read()
+            os.utime(self._file(key))
+            return value
+        except OSError: return None
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes: return
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix='.tmp-')
+        with os.fdopen(fd, 'wb') as f: f.write(value)
+        with self.lock:
+            if self.used is None: self.used = sum(size for _, size, _ in self._scan())
+            try: self.used -= os.stat(self._file(key)).st_size
+            except OSError: pass
+            os.replace(tmp, self._file(key))
+            self.used += len(value)
+            if self.used > self.max_bytes: self._evict()
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.startswith('.tmp-'): continue
+            try: st = entry.stat()
+            except OSError: continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        entries = self._scan()
+        self.used = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if self.used <= self.max_bytes * 0.9: break
+            try: os.remove(path)
+            except OSError: continue
+            self.used -= size
+            count('evictions')
+
+def make_cache():
+    backend = os.environ.get('ICO_CACHE_BACKEND', 'memory')
+    max_bytes = int(os.environ.get('ICO_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    if backend == 'memory': return MemoryCache(max_bytes)
+    if backend == 'disk': return DiskCache(os.environ.get('ICO_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ico_cache')), max_bytes)
+    return None
+
+result_cache = make_cache()
+
+RENDERERS = {'ico': render_ico, 'package': render_package}
+OUTPUT_TYPES = {'ico': ('image/x-icon', 'favicon.ico'), 'package': ('application/zip', 'favicon-package.zip')}
+
+def convert_cached(source, sizes, key=None, block=False, fmt='ico', **options):
+    key = key or cache_key(source, sizes=sizes, format=fmt, **options)
+    ico = result_cache.get(key) if result_cache else None
+    if ico is not None:
+        count('hits')
+        return ico
+    count('misses')
+    # 进程池需要可序列化的参数，只有这时才把上传流读成 bytes
+    if image_workers.mode == 'process' and hasattr(source, 'read'): source = source.read()
+    ico = image_workers.run(functools.partial(RENDERERS[fmt], **options), source, sizes, block=block)
+    if result_cache: result_cache.set(key, ico)
+    return ico
+
+# ==========================================
+# 6. 批量转换：线程池并行处理，边完成边输出 ZIP
+# ==========================================
+BATCH_MAX_FILES = 200
+BATCH_MAX_UNCOMPRESSED = 64 * 1024 * 1024  # 所有 ZIP 成员声明的解压后总大小
+batch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('ICO_BATCH_WORKERS', os.cpu_count() or 2)))
+
+class ZipStream(io.RawIOBase):
+    # 只写、不可 seek 的缓冲区：zipfile 写入后由生成器取走，避免整个压缩包留在内存里
+    def __init__(self): self.chunks = []
+    def writable(self): return True
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+def read_member(archive, info):
+    # 在工作线程中按需解压；声明的 file_size 不可信，实际解压超过单文件上限即中止
+    limit = int(app.config['MAX_CONTENT_LENGTH'])
+    with archive.open(info) as f: data = f.read(limit + 1)
+    if len(data) > limit: raise ImageTooLarge("File too large")
+    return data
+
+def collect_batch(files):
+    # 返回 [(原文件名, bytes / 读取函数 / 异常)]；上传的 .zip 会被展开成其中的每个文件
+    # ZIP 成员此时只检查数量和声明的总大小，不解压，由 stream_batch 的工作线程逐个读取
+    items, declared = [], 0
+    for file in files:
+        if file.filename == '': continue
+        data = file.read()
+        if not zipfile.is_zipfile(io.BytesIO(data)):
+            items.append((file.filename, data))
+            continue
+        archive = zipfile.ZipFile(io.BytesIO(data))
+        members = [info for info in archive.infolist() if not info.is_dir() and not os.path.basename(info.filename).startswith('.')]
+        if len(items) + len(members) > BATCH_MAX_FILES: raise ValueError(f"Too many files: {len(items) + len(members)}")
+        for info in members:
+            if info.file_size > app.config['MAX_CONTENT_LENGTH']:
+                items.append((info.filename, ImageTooLarge("File too large")))
+                continue
+            declared += info.file_size
+            items.append((info.filename, functools.partial(read_member, archive, info)))
+        if declared > BATCH_MAX_UNCOMPRESSED: raise ImageTooLarge(f"Batch too large: {declared} bytes uncompressed")
+    if len(items) > BATCH_MAX_FILES: raise ValueError(f"Too many files: {len(items)}")
+    return items
+
+def convert_item(source, sizes, options):
+    # 失败时丢弃 traceback：其中的栈帧引用着解压后的数据，会随 future 一直留到整个批次结束
+    try: return convert_cached(source() if callable(source) else source, sizes, block=True, **options)
+    except Exception as e: raise e.with_traceback(None) from None
+
+def ico_name(source, used):
+    stem = os.path.splitext(os.path.basename(source))[0] or 'favicon'
+    name, n = f"{stem}.ico", 1
+    while name in used:
+        n += 1
+        name = f"{stem}-{n}.ico"
+    used.add(name)
+    return name
+
+def batch_error(source, e):
+    # 清单中只写 job_error() 的简短说明，原始异常（可能含对象地址、内部路径）只进日志
+    code, message = job_error(e)
+    log_event('batch_item_failed', logging.ERROR if code >= 500 else logging.WARNING, source=source, error=str(e), error_type=type(e).__name__)
+    return {'source': source, 'status': 'error', 'code': code, 'error': message}
+
+def stream_batch(items, sizes, options):
+    buffer = ZipStream()
+    manifest, used = [], set()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        futures = {}
+        for source, data in items:
+            if isinstance(data, Exception): manifest.append(batch_error(source, data))
+            else: futures[batch_executor.submit(convert_item, data, sizes, options)] = source
+        for future in as_completed(futures):
+            source = futures.pop(future)
+            try: ico = future.result()
+            except Exception as e:
+                manifest.append(batch_error(source, e))
+                continue
+            name = ico_name(source, used)
+            archive.writestr(name, ico)
+            manifest.append({'source': source, 'status': 'ok', 'output': name})
+            yield buffer.drain()
+        archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+    yield buffer.drain()
+
+# ==========================================
+# 7. 异步任务：POST /jobs 立即返回任务 ID，结果在有界、带过期时间的存储中保留
+# ==========================================
+# 注意：部分 serverless 平台在响应返回后会冻结实例，需要常驻进程才能保证后台任务持续执行
+JOB_TTL = float(os.environ.get('ICO_JOB_TTL', 600))
+JOB_MAX_ENTRIES = int(os.environ.get('ICO_JOB_MAX', 256))
+JOB_WORKERS = int(os.environ.get('ICO_JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.environ.get('ICO_JOB_QUEUE_SIZE', 16))
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS)
+# 每个排队中的任务都持有完整的上传数据，超过 执行中 + 排队上限 时直接拒绝，与 ImageWorkers 相同
+job_slots = threading.BoundedSemaphore(JOB_WORKERS + JOB_QUEUE_SIZE)
+
+class JobStore:
+    def __init__(self, ttl, max_entries):
+        self.ttl, self.max_entries, self.jobs, self.lock = ttl, max_entries, OrderedDict(), threading.Lock()
+
+    def _expire(self):
+        now = time.time()
+        while self.jobs:
+            job_id, job = next(iter(self.jobs.items()))
+            if job['expires'] > now and len(self.jobs) <= self.max_entries: break
+            self.jobs.popitem(last=False)
+
+    def create(self, **fields):
+        job_id = secrets.token_urlsafe(16)
+        with self.lock:
+            self.jobs[job_id] = dict(fields, status='queued', created=time.time(), expires=time.time() + self.ttl)
+            self._expire()
+        return job_id
+
+    def update(self, job_id, **fields):
+        with self.lock:
+            if job_id in self.jobs: self.jobs[job_id].update(fields)
+
+    def discard(self, job_id):
+        with self.lock: self.jobs.pop(job_id, None)
+
+    def get(self, job_id):
+        with self.lock:
+            self._expire()
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+job_store = JobStore(JOB_TTL, JOB_MAX_ENTRIES)
+
+def submit_job(job_id, data, sizes, key, fmt, options):
+    if not job_slots.acquire(blocking=False):
+        count('jobs_rejected', stats=POOL_STATS)
+        raise QueueFull("Job queue is full")
+    try: job_executor.submit(run_job, job_id, data, sizes, key, fmt, options)
+    except Exception:
+        job_slots.release()
+        raise
+
+def job_error(e):
+    # 已知的客户端错误映射为 4xx 和简短说明；其它错误只返回通用信息，细节写入日志
+    if isinstance(e, ImageTooLarge): return 413, 'file too large'
+    if isinstance(e, InvalidFrame): return 400, 'invalid frame'
+    if isinstance(e, UnidentifiedImageError): return 400, 'invalid image'
+    if isinstance(e, zipfile.BadZipFile): return 400, 'invalid archive member'
+    if isinstance(e, JobTimeout): return 504, 'timeout'
+    return 500, 'conversion failed'
+
+def run_job(job_id, data, sizes, key, fmt, options):
+    job_store.update(job_id, status='running', started=time.time())
+    try: result = convert_cached(data, sizes, key, block=True, fmt=fmt, **options)
+    except Exception as e:
+        code, message = job_error(e)
+        log_event('job_failed', logging.ERROR if code >= 500 else logging.WARNING, job=job_id, error=str(e), error_type=type(e).__name__)
+        job_store.update(job_id, status='error', error=message, code=code, finished=time.time())
+        return
+    finally: job_slots.release()
+    job_store.update(job_id, status='done', result=result, finished=time.time())
+
+# ==========================================
+# 8. 全球语言包：translations/<lang>.json，按需加载
+# ==========================================
+# 冷启动只读取语言列表（代码 → 名称），各语言的完整文案在首次访问该语言时才加载
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'translations')
+with open(os.path.join(TRANSLATIONS_DIR, 'languages.json'), encoding='utf-8') as f: LANGUAGES = json.load(f)
+SUPPORTED_LANGS = list(LANGUAGES)
 DEFAULT_LANG = 'en'
 
+@functools.lru_cache(maxsize=None)
+def get_translations(lang_code):
+    with open(os.path.join(TRANSLATIONS_DIR, f'{lang_code}.json'), encoding='utf-8') as f: return json.load(f)
+
+# ==========================================
+# 9. 页面缓存：每个 (页面, 语言, 域名) 只渲染一次，附带强 ETag 和预压缩版本
+# ==========================================
+# 缓存只存在于进程内存中，新部署即新实例；ETag 同时包含部署 ID，浏览器缓存也会随部署失效
+DEPLOY_ID = os.environ.get('VERCEL_GIT_COMMIT_SHA') or os.environ.get('VERCEL_DEPLOYMENT_ID') or ''
+PAGE_CACHE_MAX_ENTRIES = 256  # Host 头由客户端控制，必须限制条目数
+PAGE_MAX_AGE = int(os.environ.get('ICO_PAGE_MAX_AGE', 3600))
+PAGE_BROTLI_QUALITY = int(os.environ.get('ICO_BROTLI_QUALITY', 9))  # 11 只再小约 10%，但在冷启动的首个请求上要多花 100ms 以上
+_page_cache, _page_lock = OrderedDict(), threading.Lock()
+
+class CachedPage:
+    def __init__(self, body, mimetype):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(DEPLOY_ID.encode() + self.body).hexdigest()[:32]
+        self.encoded = {'gzip': gzip.compress(self.body, 9)}
+        if brotli: self.encoded['br'] = brotli.compress(self.body, quality=PAGE_BROTLI_QUALITY)
+
+def cached_page(key, build, mimetype):
+    key = key + (request.url_root,)
+    with _page_lock:
+        page = _page_cache.get(key)
+        if page is not None:
+            _page_cache.move_to_end(key)
+            return page
+    page = CachedPage(build(), mimetype)
+    with _page_lock:
+        _page_cache[key] = page
+        while len(_page_cache) > PAGE_CACHE_MAX_ENTRIES: _page_cache.popitem(last=False)
+    return page
+
+def serve_page(page, max_age=PAGE_MAX_AGE, immutable=False):
+    # 强校验 ETag 必须区分内容编码：压缩版本在内容 ETag 后加 -br / -gzip 后缀，条件请求按实际要返回的版本比较
+    encoding = next((e for e in ('br', 'gzip') if e in page.encoded and request.accept_encodings[e]), None)
+    etag = f'{page.etag}-{encoding}' if encoding else page.etag
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': f'public, max-age={max_age}' + (', immutable' if immutable else ''), 'Vary': 'Accept-Encoding'}
+    if etag in request.if_none_match: return Response(status=304, headers=headers)
+    if encoding: return Response(page.encoded[encoding], mimetype=page.mimetype, headers=dict(headers, **{'Content-Encoding': encoding}))
+    return Response(page.body, mimetype=page.mimetype, headers=headers)
+
+# 静态资源：static/ 下的文件与根目录的 favicon.ico。ETag 只取决于内容，模板用 asset_url() 生成带内容指纹的地址，
+# 指纹匹配的请求可永久缓存；构建时生成的 .br / .gz 解压校验一致后直接使用，缺失时才在内存中压缩
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STATIC_MAX_AGE = 365 * 24 * 3600
+STATIC_TYPES = {'.css': 'text/css', '.js': 'text/javascript', '.ico': 'image/vnd.microsoft.icon', '.png': 'image/png', '.svg': 'image/svg+xml'}
+PRECOMPRESSED = {'br': '.br', 'gzip': '.gz'}
+
+class StaticAsset:
+    def __init__(self, path, mimetype):
+        with open(path, 'rb') as f: self.body = f.read()
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.version = self.etag[:12]
+        self.encoded = {}
+        for encoding, suffix in PRECOMPRESSED.items():
+            try:
+                with open(path + suffix, 'rb') as f: data = f.read()
+            except OSError: continue
+            try: fresh = (brotli.decompress(data) if encoding == 'br' else gzip.decompress(data)) == self.body
+            except Exception: fresh = False
+            if fresh: self.encoded[encoding] = data
+        if 'gzip' not in self.encoded: self.encoded['gzip'] = gzip.compress(self.body, 9)
+        if brotli and 'br' not in self.encoded: self.encoded['br'] = brotli.compress(self.body, quality=PAGE_BROTLI_QUALITY)
+        # 已压缩的格式（PNG 负载的 ICO 等）再压缩往往更大，只保留确实更小的版本
+        self.encoded = {encoding: data for encoding, data in self.encoded.items() if len(data) < len(self.body)}
+
+@functools.lru_cache(maxsize=64)
+def static_asset(path):
+    # path 相对项目根目录；类型不允许或文件不存在时返回 None
+    mimetype = STATIC_TYPES.get(os.path.splitext(path)[1])
+    if mimetype is None: return None
+    try: return StaticAsset(os.path.join(ROOT_DIR, path), mimetype)
+    except OSError: return None
+
+def asset_url(path):
+    # 模板使用：返回带指纹的地址，资源不存在时返回 None（由模板决定回退方式）
+    asset = static_asset(path)
+    return f"/{path}?v={asset.version}" if asset else None
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+def serve_asset(asset):
+    # 指纹与内容一致时永久缓存；无指纹（如浏览器直接请求 /favicon.ico）或指纹过期时按页面缓存时间
+    if request.args.get('v') == asset.version: return serve_page(asset, STATIC_MAX_AGE, immutable=True)
+    return serve_page(asset)
+
 # ==========================================
-# 4. 路由逻辑
+# 10. 路由逻辑
 # ==========================================
 def render_index(lang_code):
     if lang_code not in SUPPORTED_LANGS: return redirect(f"/{DEFAULT_LANG}")
+    return serve_page(cached_page(('index', lang_code), lambda: _render_index(lang_code), 'text/html'))
+
+def _render_index(lang_code):
     base_url = request.url_root.rstrip('/')
-    alternates = [{'lang': l, 'name': TRANSLATIONS[l]['name'], 'href': f"{base_url}/{l}"} for l in SUPPORTED_LANGS]
-    return render_template('index.html', t=TRANSLATIONS[lang_code], current_lang=lang_code, alternates=alternates, base_url=base_url)
+    alternates = [{'lang': l, 'name': LANGUAGES[l], 'href': f"{base_url}/{l}"} for l in SUPPORTED_LANGS]
+    return render_template('index.html', t=get_translations(lang_code), current_lang=lang_code, alternates=alternates, base_url=base_url)
 
-for lang in SUPPORTED_LANGS:
-    app.add_url_rule(f'/{lang}', endpoint=f'view_{lang}', view_func=render_index, defaults={'lang_code': lang})
+# 一条 any() 规则覆盖全部语言，代替逐个语言注册路由
+app.add_url_rule(f"/<any({', '.join(SUPPORTED_LANGS)}):lang_code>", endpoint='view_lang', view_func=render_index)
 
 @app.errorhandler(404)
 def page_not_found(e): return redirect(f"/{DEFAULT_LANG}")
@@ -458,43 +1114,146 @@ def root():
 @app.route('/generate', methods=['POST'])
 @limiter.limit("15 per minute")
 def generate_ico():
-    if 'file' not in request.files: return "Error", 400
-    file = request.files['file']
+    records = []
+    token = _stage_records.set(records)
+    try: response = make_response(_generate_ico())
+    finally: _stage_records.reset(token)
+    observe_stages(records)
+    if records: response.headers['Server-Timing'] = server_timing(records)
+    total = sum(seconds for name, seconds, _ in records if name != 'queue')
+    if total * 1000 > SLOW_REQUEST_MS: log_event('slow_request', logging.WARNING, status=response.status_code, total_ms=round(total * 1000, 1), stages=stage_log(records))
+    return response
+
+def _generate_ico():
+    # multipart 表单在第一次访问时才解析，上传数据也在这里读入
+    with stage('read'): files = request.files
+    if 'file' not in files: return "Error", 400
+    file = files['file']
     if file.filename == '': return "Error", 400
+    fmt = request.form.get('format', 'ico')
+    if fmt not in RENDERERS: return "Error", 400
+    try: sizes, options = parse_sizes(request.form, fmt), parse_options(request.form)
+    except ValueError: return "Error", 400
+    if fmt == 'package': options['name'] = package_name(request.form, file.filename)
     try:
-        size = int(request.form.get('size', '32'))
-        file_bytes = file.read()
-        if len(file_bytes) == 0: return "Error", 400
-        input_stream = io.BytesIO(file_bytes)
-        img = Image.open(input_stream)
-        if img.width > 2500 or img.height > 2500: img.thumbnail((512, 512), Image.Resampling.LANCZOS)
-        if img.mode != "RGBA": img = img.convert("RGBA")
-        img = add_smart_glow(img)
-        img = img.resize((size, size), Image.Resampling.LANCZOS)
-        output_stream = io.BytesIO()
-        img.save(output_stream, format='ICO', sizes=[(size, size)])
-        output_stream.seek(0)
-        return send_file(output_stream, mimetype='image/x-icon', as_attachment=True, download_name='favicon.ico')
+        sniff_image(file.stream)
+        with stage('hash'): key = cache_key(file.stream, sizes=sizes, format=fmt, **options)
+        if key in request.if_none_match:
+            count('not_modified')
+            return Response(status=304, headers={'ETag': f'"{key}"'})
+        result = convert_cached(file.stream, sizes, key, fmt=fmt, **options)
+        mimetype, filename = OUTPUT_TYPES[fmt]
+        response = Response(result, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}', 'Cache-Control': 'no-cache'})
+        response.set_etag(key)
+        return response
+    except ImageTooLarge: return "File too large", 413
+    except (UnidentifiedImageError, InvalidFrame): return "Invalid image file", 400
+    except QueueFull: return Response("Server busy", 503, headers={'Retry-After': '5'})
+    except JobTimeout: return "Timeout", 504
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log_event('generate_failed', logging.ERROR, error=str(e), error_type=type(e).__name__, filename=file.filename, sizes=sizes, stages=stage_log(_stage_records.get()))
         return "Invalid image file", 500
 
+@app.route('/generate/batch', methods=['POST'])
+@limiter.limit("5 per minute")
+def generate_batch():
+    files = request.files.getlist('files') + request.files.getlist('file')
+    try:
+        sizes, options = parse_sizes(request.form), parse_options(request.form)
+        items = collect_batch(files)
+    except ImageTooLarge: return "File too large", 413
+    except (ValueError, zipfile.BadZipFile): return "Error", 400
+    if not items: return "Error", 400
+    return Response(stream_batch(items, sizes, options), mimetype='application/zip', headers={'Content-Disposition': 'attachment; filename=favicons.zip'})
+
+@app.route('/jobs', methods=['POST'])
+@limiter.limit("15 per minute")
+def create_job():
+    file = request.files.get('file')
+    if file is None or file.filename == '': return {'error': 'missing file'}, 400
+    fmt = request.form.get('format', 'ico')
+    if fmt not in RENDERERS: return {'error': 'invalid format'}, 400
+    try:
+        sizes, options = parse_sizes(request.form, fmt), parse_options(request.form)
+        if fmt == 'package': options['name'] = package_name(request.form, file.filename)
+        sniff_image(file.stream)
+    except ImageTooLarge: return {'error': 'file too large'}, 413
+    except (ValueError, UnidentifiedImageError): return {'error': 'invalid image'}, 400
+    except Exception as e:
+        # 与 /generate 相同：未预料的解析错误记录日志，但不把内部信息返回给客户端
+        log_event('job_rejected', logging.WARNING, error=str(e), error_type=type(e).__name__, filename=file.filename)
+        return {'error': 'invalid image'}, 400
+    data = file.read()
+    key = cache_key(data, sizes=sizes, format=fmt, **options)
+    job_id = job_store.create(key=key, format=fmt)
+    # 结果已在缓存中时直接完成，不占用后台线程
+    cached = result_cache.get(key) if result_cache else None
+    if cached is not None:
+        count('hits')
+        job_store.update(job_id, status='done', result=cached, finished=time.time())
+    else:
+        try: submit_job(job_id, data, sizes, key, fmt, options)
+        except QueueFull:
+            job_store.discard(job_id)
+            return {'error': 'server busy'}, 503, {'Retry-After': '5'}
+    return {'id': job_id, 'status': job_store.get(job_id)['status'], 'url': f"/jobs/{job_id}"}, 202, {'Location': f"/jobs/{job_id}"}
+
+@app.route('/jobs/<job_id>')
+@limiter.exempt
+def get_job(job_id):
+    job = job_store.get(job_id)
+    if job is None: return {'error': 'not found'}, 404
+    if job['status'] == 'done':
+        mimetype, filename = OUTPUT_TYPES[job['format']]
+        response = Response(job['result'], mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}', 'Cache-Control': 'no-cache'})
+        response.set_etag(job['key'])
+        return response.make_conditional(request)
+    body = {'id': job_id, 'status': job['status'], 'expires_in': max(0, round(job['expires'] - time.time()))}
+    if job['status'] == 'error': return dict(body, error=job['error']), job.get('code', 500)
+    return body, 202, {'Retry-After': '1'}
+
+@app.route('/metrics')
+@limiter.exempt
+def metrics():
+    return Response(prometheus_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stats')
+@limiter.exempt
+def stats():
+    return {
+        'cache': dict(CACHE_STATS, backend=type(result_cache).__name__ if result_cache else None),
+        'encode': dict(ENCODE_STATS),
+        'workers': dict(POOL_STATS, mode=image_workers.mode, queue_depth=max(POOL_STATS['in_flight'] - image_workers.workers, 0)),
+    }
+
 @app.route('/sitemap.xml')
 def sitemap():
+    today = datetime.date.today().isoformat()
+    return serve_page(cached_page(('sitemap', today), lambda: _render_sitemap(today), 'application/xml'))
+
+def _render_sitemap(today):
     base_url = request.url_root.rstrip('/')
     urls = []
-    today = datetime.date.today().isoformat()
     for lang in SUPPORTED_LANGS:
         urls.append(f"""<url><loc>{base_url}/{lang}</loc><lastmod>{today}</lastmod><changefreq>weekly</changefreq><priority>{'1.0' if lang == 'en' else '0.8'}</priority></url>""")
-    xml = f"""<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{''.join(urls)}</urlset>"""
-    return Response(xml, mimetype="application/xml")
+    return f"""<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{''.join(urls)}</urlset>"""
 
 @app.route('/robots.txt')
 def robots():
+    return serve_page(cached_page(('robots',), _render_robots, 'text/plain'))
+
+def _render_robots():
     base_url = request.url_root.rstrip('/')
-    lines = ["User-agent: *", "Allow: /", "Disallow: /generate", f"Sitemap: {base_url}/sitemap.xml"]
-    return Response("\n".join(lines), mimetype="text/plain")
+    lines = ["User-agent: *", "Allow: /", "Disallow: /generate", "Disallow: /jobs", f"Sitemap: {base_url}/sitemap.xml"]
+    return "\n".join(lines)
 
 @app.route('/favicon.ico')
 def favicon():
-    return send_file('../favicon.ico', mimetype='image/vnd.microsoft.icon')
+    return serve_asset(static_asset('favicon.ico'))
+
+@app.route('/static/<path:name>')
+def static_file(name):
+    path = safe_join('static', name)
+    asset = static_asset(path) if path else None
+    if asset is None: return "Not found", 404
+    return serve_asset(asset)
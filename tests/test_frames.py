@@ -0,0 +1,28 @@
+# frame=sharpest：不同尺寸的 ICO 条目要在同一尺寸上比较，不能因为小图"每像素边缘更多"而选中它
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from api.index import open_image, render_frames, select_frame
+
+def multi_size_ico(sides):
+    img = Image.new('RGBA', (512, 512), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((64, 64, 448, 448), fill=(200, 40, 40, 255))  # 边缘只在轮廓上，按像素平均时小尺寸条目的分数更高
+    stream = io.BytesIO()
+    img.save(stream, 'ICO', sizes=[(s, s) for s in sides])
+    return stream.getvalue()
+
+def test_sharpest_prefers_entry_at_target_size():
+    data = multi_size_ico([16, 32, 48, 256])
+    assert select_frame(open_image(io.BytesIO(data)), 'sharpest', 256).size == (256, 256)
+    assert select_frame(open_image(io.BytesIO(data)), 'sharpest', 32).size[0] >= 32
+
+def test_sharpest_renders_from_large_entry():
+    data = multi_size_ico([16, 32, 48, 256])
+    expected = render_frames(data, [256], frame='largest')[0]
+    assert render_frames(data, [256], frame='sharpest')[0].tobytes() == expected.tobytes()
@@ -0,0 +1,33 @@
+# add_smart_glow 的 numpy 实现必须与 Pillow 逐次 alpha_composite 的旧实现逐像素一致
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from api.index import _add_smart_glow_legacy, add_smart_glow, numpy
+
+np = pytest.importorskip('numpy')
+pytestmark = pytest.mark.skipif(numpy() is None, reason='numpy fast path unavailable')
+
+def random_rgba(rng, alpha):
+    h, w = rng.integers(1, 120, 2)
+    pixels = rng.integers(0, 256, (h, w, 4), dtype=np.uint8)
+    if alpha == 'binary': pixels[..., 3] = np.where(pixels[..., 3] > 128, 255, 0)
+    elif alpha == 'stepped': pixels[..., 3] = rng.integers(0, 4, (h, w)) * 85
+    pixels[0, 0, 3] = 0  # 保证不被当作完全不透明而直接返回
+    return Image.fromarray(pixels, 'RGBA')
+
+@pytest.mark.parametrize('alpha', ['binary', 'stepped', 'arbitrary'])
+@pytest.mark.parametrize('seed', range(10))
+def test_matches_legacy(alpha, seed):
+    img = random_rgba(np.random.default_rng(seed), alpha)
+    expected = _add_smart_glow_legacy(img, img.getchannel('A'))
+    assert add_smart_glow(img).tobytes() == expected.tobytes()
+
+def test_opaque_image_is_returned_unchanged():
+    img = Image.new('RGBA', (8, 8), (10, 20, 30, 255))
+    assert add_smart_glow(img) is img
@@ -0,0 +1,65 @@
+# encode_ico 手写的 ICO / DIB 容器必须能被 Pillow 的 ICO 解码器读回原样的像素
+import io
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from api.index import encode_ico
+
+SIDES = (256, 33, 31)
+
+def frame(side, colors=None):
+    # 完全透明的角落、半透明的边框和不透明的内部；colors 限定颜色数以便 PNG8 生效
+    img = Image.new('RGBA', (side, side), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((1, 1, side - 2, side - 2), fill=(30, 120, 200, 128))
+    draw.rectangle((side // 4, side // 4, side * 3 // 4, side * 3 // 4), fill=(220, 60, 40, 255))
+    if colors is None:
+        for x in range(side): img.putpixel((x, side // 2), (x % 256, 255 - x % 256, 7 * x % 256, 255))
+    return img
+
+def entries(data):
+    # 逐条返回 (宽, 高, 负载)，按目录中的偏移切出
+    _, _, count = struct.unpack_from('<HHH', data)
+    for i in range(count):
+        w, h, _, _, _, _, size, offset = struct.unpack_from('<BBBBHHII', data, 6 + 16 * i)
+        yield w or 256, h or 256, data[offset:offset + size]
+
+@pytest.mark.parametrize('encoding,palette,colors', [('png', False, None), ('bmp', False, None), ('auto', True, None), ('auto', True, 4)])
+def test_round_trip(encoding, palette, colors):
+    frames = [frame(side, colors) for side in SIDES]
+    data = encode_ico(frames, encoding, palette)
+    ico = Image.open(io.BytesIO(data))
+    assert ico.format == 'ICO'
+    assert sorted(ico.info['sizes']) == sorted((s, s) for s in SIDES)
+    for f in frames:
+        decoded = ico.ico.getimage(f.size).convert('RGBA')
+        assert decoded.size == f.size
+        assert decoded.tobytes() == f.tobytes()
+
+@pytest.mark.parametrize('side', SIDES)
+def test_bmp_and_mask(side):
+    # AND 掩码：自下而上、每行按 4 字节对齐，透明像素置 1
+    f = frame(side)
+    (w, h, payload), = entries(encode_ico([f], 'bmp'))
+    assert (w, h) == (side, side)
+    header_size, width, height, _, bpp = struct.unpack_from('<IiiHH', payload)
+    assert (header_size, width, height, bpp) == (40, side, side * 2, 32)
+    stride = (side + 31) // 32 * 4
+    mask = payload[40 + side * side * 4:]
+    assert len(mask) == stride * side
+    alpha = f.getchannel('A')
+    for y in range(side):
+        row = mask[(side - 1 - y) * stride:(side - y) * stride]
+        bits = [row[x // 8] >> (7 - x % 8) & 1 for x in range(side)]
+        assert bits == [int(alpha.getpixel((x, y)) == 0) for x in range(side)]
+
+def test_auto_palette_picks_png8_for_few_colors():
+    data = encode_ico([frame(side, 4) for side in SIDES], 'auto', True)
+    assert [Image.open(io.BytesIO(payload)).mode for _, _, payload in entries(data)] == ['P'] * len(SIDES)
@@ -0,0 +1,97 @@
+# 限流存储：SQLiteStorage 必须在线程和进程之间共享计数，BatchedStorage 在一个同步周期内不得访问后端
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from limits.errors import ConfigurationError
+from limits.storage import MemoryStorage
+
+from api.index import BatchedStorage, SQLiteStorage
+
+class CountingStorage(MemoryStorage):
+    # 本地替身：行为同 memory://，另外记录每种后端调用的次数
+    STORAGE_SCHEME = ["counting"]
+    calls = Counter()
+
+    def incr(self, key, expiry, amount=1):
+        self.calls['incr'] += 1
+        return super().incr(key, expiry, amount=amount)
+
+    def get(self, key):
+        self.calls['get'] += 1
+        return super().get(key)
+
+    def get_expiry(self, key):
+        self.calls['get_expiry'] += 1
+        return super().get_expiry(key)
+
+@pytest.fixture
+def batched():
+    CountingStorage.calls.clear()
+    storage = BatchedStorage('batched+counting://', flush_interval=60)
+    yield storage
+    storage.pending.clear()
+
+def hit_sqlite(path, hits):
+    storage = SQLiteStorage(f'sqlite://{path}')
+    for _ in range(hits): storage.incr('ip', 60)
+
+def test_sqlite_rejects_in_memory_database():
+    for uri in ('sqlite://', 'sqlite://:memory:'):
+        with pytest.raises(ConfigurationError): SQLiteStorage(uri)
+
+def test_sqlite_shared_across_threads(tmp_path):
+    storage = SQLiteStorage(f'sqlite://{tmp_path}/limits.db')
+    threads = [threading.Thread(target=lambda: [storage.incr('ip', 60) for _ in range(25)]) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert storage.get('ip') == 200
+
+def test_sqlite_shared_across_processes(tmp_path):
+    path = f'{tmp_path}/limits.db'
+    SQLiteStorage(f'sqlite://{path}')  # 先建表，避免多个进程同时切换 WAL
+    procs = [multiprocessing.get_context('spawn').Process(target=hit_sqlite, args=(path, 25)) for _ in range(4)]
+    for p in procs: p.start()
+    for p in procs: p.join()
+    assert [p.exitcode for p in procs] == [0] * 4
+    assert SQLiteStorage(f'sqlite://{path}').get('ip') == 100
+
+def test_sqlite_window_expires(tmp_path):
+    storage = SQLiteStorage(f'sqlite://{tmp_path}/limits.db')
+    assert storage.incr('ip', 0.2) == 1
+    assert storage.incr('ip', 0.2) == 2
+    time.sleep(0.3)
+    assert storage.get('ip') == 0
+    assert storage.incr('ip', 0.2) == 1
+
+def test_batched_new_key_stays_local(batched):
+    started = time.time()
+    values = [batched.incr('ip', 60) for _ in range(100)]
+    assert values == list(range(1, 101))
+    assert batched.get('ip') == 100
+    assert started + 60 <= batched.get_expiry('ip') <= time.time() + 60
+    assert CountingStorage.calls == {'get': 1}
+
+def test_batched_flush_pushes_one_increment(batched):
+    for _ in range(100): batched.incr('ip', 60)
+    batched.flush()
+    assert CountingStorage.calls['incr'] == 1
+    assert batched.backend.get('ip') == 100
+    CountingStorage.calls.clear()
+    assert batched.incr('ip', 60) == 101
+    assert not CountingStorage.calls
+
+def test_batched_reads_existing_backend_window(batched):
+    for _ in range(5): batched.backend.incr('ip', 60)
+    expires = batched.backend.get_expiry('ip')
+    CountingStorage.calls.clear()
+    assert batched.incr('ip', 60) == 6
+    assert batched.get_expiry('ip') == expires
+    assert CountingStorage.calls == {'get': 1, 'get_expiry': 1}
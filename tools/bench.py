@@ -0,0 +1,142 @@
+# 转换流程基准测试：python tools/bench.py [--json run.json] [--compare base.json]
+# 使用合成样例分别统计解码 / 缩放 / 描边 / 编码各阶段耗时、吞吐量和峰值内存，并通过 Flask test client 测量端到端延迟分位数
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+import api.index as ico
+
+def _shape(size, mode, background):
+    img = Image.new(mode, size, background)
+    draw = ImageDraw.Draw(img)
+    w, h = size
+    draw.ellipse((w // 8, h // 8, w * 7 // 8, h * 7 // 8), fill=(220, 60, 40, 255) if mode == 'RGBA' else (220, 60, 40))
+    draw.rectangle((w // 3, h // 3, w * 2 // 3, h * 2 // 3), fill=(30, 120, 200, 160) if mode == 'RGBA' else (30, 120, 200))
+    return img
+
+def _encode(img, fmt, **params):
+    stream = io.BytesIO()
+    img.save(stream, fmt, **params)
+    return stream.getvalue()
+
+FIXTURES = {
+    'tiny_png': lambda: _encode(_shape((16, 16), 'RGBA', (0, 0, 0, 0)), 'PNG'),
+    'transparent_rgba_512': lambda: _encode(_shape((512, 512), 'RGBA', (0, 0, 0, 0)), 'PNG'),
+    'opaque_rgba_512': lambda: _encode(_shape((512, 512), 'RGBA', (255, 255, 255, 255)), 'PNG'),
+    'palette_gif_256': lambda: _encode(_shape((256, 256), 'RGB', (255, 255, 255)).convert('P', palette=Image.Palette.ADAPTIVE), 'GIF'),
+    'large_jpeg_4000': lambda: _encode(_shape((4000, 3000), 'RGB', (250, 250, 250)), 'JPEG', quality=85),
+    'near_limit_png_2500': lambda: _encode(_shape((2500, 2500), 'RGBA', (0, 0, 0, 0)), 'PNG'),
+}
+
+def run_stages(data, sizes):
+    # 复用 render_ico 内置的分阶段计时
+    _, records = ico.record_stages(ico.render_ico, data, sizes)
+    return {name: seconds for name, (seconds, _) in ico.stage_totals(records).items()}
+
+def bench_fixture(name, sizes, repeat):
+    # 在独立子进程中运行，ru_maxrss 的增量即为该样例的峰值内存
+    data = FIXTURES[name]()
+    run_stages(FIXTURES['tiny_png'](), sizes)  # 预热：延迟导入的插件和 numpy 不计入峰值
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    runs = [run_stages(data, sizes) for _ in range(repeat)]
+    totals = [sum(r.values()) for r in runs]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    return {
+        'input_bytes': len(data),
+        'stages_ms': {stage: statistics.median(r.get(stage, 0.0) for r in runs) * 1000 for stage in ('decode', 'resize', 'glow', 'encode')},
+        'total_ms': statistics.median(totals) * 1000,
+        'images_per_second': repeat / sum(totals),
+        'peak_rss_kb': peak,
+    }
+
+ENCODINGS = [('png', False), ('bmp', False), ('auto', False), ('auto', True)]
+
+def bench_encodings(name, sizes, repeat):
+    # 同一组帧用不同编码方式各编码 repeat 次，比较编码耗时与输出大小
+    frames = ico.render_frames(FIXTURES[name](), sizes)
+    results = {}
+    for encoding, palette in ENCODINGS:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = ico.encode_ico(frames, encoding, palette)
+            timings.append(time.perf_counter() - started)
+        results[encoding + ('+palette' if palette else '')] = {'encode_ms': statistics.median(timings) * 1000, 'bytes': len(data)}
+    return results
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def bench_http(name, sizes, requests):
+    data = FIXTURES[name]()
+    ico.limiter.enabled = False
+    ico.result_cache = None
+    client = ico.app.test_client()
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.post('/generate', data={'file': (io.BytesIO(data), name), 'sizes': ','.join(map(str, sizes))}, content_type='multipart/form-data')
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200: raise RuntimeError(f"{name}: HTTP {response.status_code}")
+    return {'p50_ms': percentile(latencies, 50), 'p90_ms': percentile(latencies, 90), 'p99_ms': percentile(latencies, 99), 'max_ms': max(latencies)}
+
+def compare(current, base):
+    print(f"\n{'fixture':<24}{'base ms':>10}{'now ms':>10}{'change':>10}")
+    for name, result in current['pipeline'].items():
+        if name not in base.get('pipeline', {}): continue
+        before, now = base['pipeline'][name]['total_ms'], result['total_ms']
+        print(f"{name:<24}{before:>10.2f}{now:>10.2f}{(now - before) / before * 100:>+9.1f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the ICO conversion pipeline.')
+    parser.add_argument('--sizes', default='16,32,48,64', help='comma separated icon sizes')
+    parser.add_argument('--repeat', type=int, default=10, help='pipeline iterations per fixture')
+    parser.add_argument('--requests', type=int, default=30, help='HTTP requests per fixture (0 to skip)')
+    parser.add_argument('--only', action='append', choices=sorted(FIXTURES), help='run only these fixtures')
+    parser.add_argument('--encodings', action='store_true', help='compare ICO encodings (time vs. size)')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='compare against a previous --json result')
+    args = parser.parse_args(argv)
+    sizes = ico.normalize_sizes(args.sizes.split(','))
+    names = args.only or list(FIXTURES)
+
+    results = {'sizes': sizes, 'numpy': ico.numpy() is not None, 'pipeline': {}, 'http': {}}
+    print(f"{'fixture':<24}{'decode':>9}{'resize':>9}{'glow':>9}{'encode':>9}{'total':>9}{'img/s':>9}{'peak KB':>10}")
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1) as pool: r = pool.submit(bench_fixture, name, sizes, args.repeat).result()
+        results['pipeline'][name] = r
+        s = r['stages_ms']
+        print(f"{name:<24}{s['decode']:>9.2f}{s['resize']:>9.2f}{s['glow']:>9.2f}{s['encode']:>9.2f}{r['total_ms']:>9.2f}{r['images_per_second']:>9.1f}{r['peak_rss_kb']:>10}")
+
+    if args.encodings:
+        labels = [e + ('+palette' if p else '') for e, p in ENCODINGS]
+        print(f"\n{'fixture':<24}" + ''.join(f"{label:>22}" for label in labels))
+        results['encodings'] = {}
+        for name in names:
+            r = results['encodings'][name] = bench_encodings(name, sizes, args.repeat)
+            print(f"{name:<24}" + ''.join(f"{r[label]['bytes']:>11} B {r[label]['encode_ms']:>6.2f} ms" for label in labels))
+
+    if args.requests:
+        print(f"\n{'fixture':<24}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name in names:
+            r = results['http'][name] = bench_http(name, sizes, args.requests)
+            print(f"{name:<24}{r['p50_ms']:>10.2f}{r['p90_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f: compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
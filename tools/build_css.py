@@ -0,0 +1,57 @@
+# 样式构建：python tools/build_css.py
+# 用 Tailwind CLI 扫描模板，只编译用到的类，输出压缩后的 static/app.css，并生成预压缩的 .br / .gz 版本
+# CLI 来自 PyPI 上打包好的独立可执行文件，不需要 Node：pip install tailwindcss-bin==4.3.3
+# 构建产物随代码一起提交，部署时无需再构建；static/app.css 不存在时页面回退到浏览器端编译的 CDN 版 Tailwind
+import argparse
+import gzip
+import os
+import subprocess
+import sys
+
+try: import brotli
+except ImportError: brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TAILWIND = 'tailwindcss'
+TAILWIND_VERSION = '4.3.3'
+INPUT = os.path.join(ROOT, 'tools', 'tailwind.css')
+OUTPUT = os.path.join(ROOT, 'static', 'app.css')
+
+def write(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f: f.write(data)
+    os.replace(tmp, path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the minified Tailwind stylesheet and its precompressed variants.')
+    parser.add_argument('--output', default=OUTPUT, help='stylesheet path (default: static/app.css)')
+    args = parser.parse_args(argv)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    try: result = subprocess.run([TAILWIND, '--input', INPUT, '--minify'], capture_output=True, cwd=ROOT)
+    except FileNotFoundError:
+        print(f"{TAILWIND} not found; install it with: pip install tailwindcss-bin=={TAILWIND_VERSION}", file=sys.stderr)
+        return 1
+    log = result.stderr.decode(errors='replace')
+    if result.returncode != 0:
+        sys.stderr.write(log)
+        return result.returncode
+    # 不同版本生成的类名与默认值不同（模板按 v4 的命名编写），版本不符时拒绝覆盖已提交的产物
+    if f"v{TAILWIND_VERSION}" not in log:
+        print(f"expected tailwindcss v{TAILWIND_VERSION}, got: {log.strip().splitlines()[0] if log.strip() else 'unknown'}", file=sys.stderr)
+        return 1
+    css = result.stdout
+    write(args.output, css)
+    print(f"{os.path.relpath(args.output, ROOT)}: {len(css)} bytes")
+    # 变体必须与 app.css 同时更新：服务端加载时会解压校验，不一致的变体会被忽略
+    variants = {'.gz': gzip.compress(css, 9, mtime=0)}
+    if brotli: variants['.br'] = brotli.compress(css, quality=11)
+    else:
+        print("brotli not installed, skipping .br", file=sys.stderr)
+        if os.path.exists(args.output + '.br'): os.remove(args.output + '.br')
+    for suffix, data in variants.items():
+        write(args.output + suffix, data)
+        print(f"{os.path.relpath(args.output + suffix, ROOT)}: {len(data)} bytes")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# 离线批量转换：python tools/convert.py images/ -o icons/ --sizes 16,32,48
+# 与 /generate 使用同一套处理流程，但不经过 HTTP 和限流；未变化的文件（mtime/大小或内容哈希相同）会被跳过
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.index import ICO_ENCODINGS, RESAMPLE_FILTERS, convert_image, normalize_sizes, parse_frame
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.tif', '.tiff', '.ico', '.icns'}
+MANIFEST_NAME = '.ico_manifest.json'
+
+def find_images(inputs):
+    # 返回 [(源文件路径, 相对输出路径)]
+    for path in inputs:
+        if os.path.isfile(path):
+            yield path, os.path.basename(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    full = os.path.join(root, name)
+                    yield full, os.path.relpath(full, path)
+
+def plan_outputs(images):
+    # 返回 [(源文件, 相对路径, 相对输出路径 或 None)]。logo.png 与 logo.jpg 会映射到同一个 logo.ico，
+    # 冲突时改为保留扩展名（logo.png.ico、logo.jpg.ico）；仍然重名的（如两个同名的文件参数）输出为 None
+    images = list(images)
+    default = [os.path.splitext(rel)[0] + '.ico' for _, rel in images]
+    taken = {}
+    for name in default: taken[name] = taken.get(name, 0) + 1
+    planned, used = [], set()
+    for (src, rel), name in zip(images, default):
+        if taken[name] > 1: name = rel + '.ico'
+        planned.append((src, rel, None if name in used else name))
+        used.add(name)
+    return planned
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+def convert_one(src, dst, sizes, glow, resample, encoding, palette, frame):
+    # 在子进程中执行：读取、转换并直接写出，写文件也是并行的
+    ico = convert_image(src, sizes, glow, resample, encoding, palette, frame)
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    tmp = dst + '.tmp'
+    with open(tmp, 'wb') as f: f.write(ico)
+    os.replace(tmp, dst)
+    return len(ico)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert images to ICO files.')
+    parser.add_argument('inputs', nargs='+', help='image files or directories')
+    parser.add_argument('-o', '--out', default='icons', help='output directory (default: icons)')
+    parser.add_argument('--sizes', default='32', help='comma separated icon sizes (default: 32)')
+    parser.add_argument('--no-glow', action='store_true', help='skip the white outline')
+    parser.add_argument('--resample', default='auto', choices=['auto', *RESAMPLE_FILTERS], help='resampling filter (default: auto)')
+    parser.add_argument('--encoding', default='png', choices=ICO_ENCODINGS, help='ICO entry payload (default: png)')
+    parser.add_argument('--palette', action='store_true', help='use lossless 8-bit palette PNG entries when smaller')
+    parser.add_argument('--frame', default='auto', type=parse_frame, help='frame of animated/multi-page/ICO inputs: auto, largest, sharpest or an index (default: auto)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='convert even if the source is unchanged')
+    args = parser.parse_args(argv)
+    sizes = normalize_sizes(args.sizes.split(','))
+    options = {'sizes': sizes, 'glow': not args.no_glow, 'resample': args.resample, 'encoding': args.encoding, 'palette': args.palette, 'frame': args.frame}
+
+    manifest_path = os.path.join(args.out, MANIFEST_NAME)
+    try:
+        with open(manifest_path) as f: manifest = json.load(f)
+    except (OSError, ValueError): manifest = {}
+
+    jobs, skipped, failed, collisions = {}, 0, 0, 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for src, rel, out in plan_outputs(find_images(args.inputs)):
+            if out is None:
+                collisions += 1
+                print(f"Error: {src}: output name collides with another input", file=sys.stderr)
+                continue
+            dst = os.path.join(args.out, out)
+            st = os.stat(src)
+            entry = manifest.get(rel, {})
+            if not args.force and entry.get('options') == options and os.path.exists(dst):
+                if (entry.get('mtime'), entry.get('size')) == (st.st_mtime, st.st_size):
+                    skipped += 1
+                    continue
+                digest = file_digest(src)
+                if entry.get('sha256') == digest:
+                    entry.update(mtime=st.st_mtime, size=st.st_size)
+                    skipped += 1
+                    continue
+            else: digest = file_digest(src)
+            manifest[rel] = {'mtime': st.st_mtime, 'size': st.st_size, 'sha256': digest, 'options': options}
+            jobs[pool.submit(convert_one, src, dst, sizes, not args.no_glow, args.resample, args.encoding, args.palette, args.frame)] = rel
+        for future in as_completed(jobs):
+            rel = jobs[future]
+            try: future.result()
+            except Exception as e:
+                failed += 1
+                manifest.pop(rel, None)
+                print(f"Error: {rel}: {e}", file=sys.stderr)
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(manifest_path, 'w') as f: json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"converted {len(jobs) - failed}, skipped {skipped}, failed {failed + collisions}")
+    return 1 if failed or collisions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
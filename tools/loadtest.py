@@ -0,0 +1,238 @@
+# 负载测试：python tools/loadtest.py --workers 4 --concurrency 1,4,16 --duration 10 [--json run.json]
+# 本地模拟 Vercel 的多实例部署：预先 fork 出若干单线程 WSGI 进程共享同一个监听端口（每个进程即一个"实例"，
+# 各自拥有限流计数、结果缓存和页面缓存），然后按给定比例混合回放 /<lang> 页面访问和不同尺寸的 /generate 上传，
+# 逐级提高并发，报告吞吐量、延迟分位数、错误率（含限流返回的 429）以及每个进程的内存占用
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def serve_worker(sock, threaded, ready, quiet):
+    # 在 fork 出的子进程中执行：此时才导入应用，每个进程都经历一次完整的冷启动
+    if quiet:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+    sys.path.insert(0, ROOT)
+    import logging
+    from werkzeug.serving import make_server
+    import api.index as ico
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    if os.environ.get('LOADTEST_NO_LIMIT'): ico.limiter.enabled = False
+    server = make_server('127.0.0.1', sock.getsockname()[1], ico.app, threaded=threaded, fd=sock.fileno())
+    os.write(ready, b'.')
+    server.serve_forever()
+
+def start_workers(count, threaded, quiet):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(128)
+    ready_r, ready_w = os.pipe()
+    pids = []
+    for _ in range(count):
+        pid = os.fork()
+        if pid == 0:
+            try: serve_worker(sock, threaded, ready_w, quiet)
+            finally: os._exit(1)
+        pids.append(pid)
+    started = 0
+    while started < count:
+        chunk = os.read(ready_r, count)
+        if not chunk: raise RuntimeError('worker failed to start')
+        started += len(chunk)
+    return sock, pids
+
+def stop_workers(pids):
+    for pid in pids:
+        try: os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError: pass
+    for pid in pids:
+        try: os.waitpid(pid, 0)
+        except ChildProcessError: pass
+
+def worker_memory(pid):
+    # VmRSS 为当前常驻内存，VmHWM 为进程生命周期内的峰值
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'): values[key] = int(value.split()[0])
+    except OSError: pass
+    return {'rss_kb': values.get('VmRSS'), 'peak_rss_kb': values.get('VmHWM')}
+
+def make_uploads(sides):
+    from PIL import Image, ImageDraw
+    uploads = {}
+    for side in sides:
+        img = Image.new('RGBA', (side, side), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        draw.ellipse((side // 8, side // 8, side * 7 // 8, side * 7 // 8), fill=(220, 60, 40, 255))
+        draw.rectangle((side // 3, side // 3, side * 2 // 3, side * 2 // 3), fill=(30, 120, 200, 160))
+        stream = io.BytesIO()
+        img.save(stream, 'PNG')
+        uploads[side] = stream.getvalue()
+    return uploads
+
+def multipart(fields, filename, data):
+    boundary = f'loadtest{random.getrandbits(64):016x}'
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode() for name, value in fields.items()]
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\nContent-Type: image/png\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+class Scenario:
+    # 按权重随机生成请求；unique 时在 PNG 的 IEND 之后追加随机字节，内容哈希不同但图像不变，用于绕过结果缓存
+    def __init__(self, mix, langs, uploads, ico_sizes, unique):
+        self.kinds = [kind for kind, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.langs, self.uploads, self.ico_sizes, self.unique = langs, uploads, ico_sizes, unique
+
+    def next(self, rng):
+        kind = rng.choices(self.kinds, self.weights)[0]
+        if kind == 'page':
+            return kind, 'GET', '/' + rng.choice(self.langs), None, {'Accept-Encoding': 'br, gzip'}
+        side = rng.choice(list(self.uploads))
+        data = self.uploads[side] + (rng.randbytes(16) if self.unique else b'')
+        body, content_type = multipart({'sizes': self.ico_sizes}, f'{side}.png', data)
+        return f'generate_{side}', 'POST', '/generate', body, {'Content-Type': content_type}
+
+def client_loop(host, port, scenario, deadline, source_ips, seed, results):
+    rng = random.Random(seed)
+    source = (rng.choice(source_ips), 0) if source_ips else None
+    conn = None
+    while time.perf_counter() < deadline:
+        kind, method, path, body, headers = scenario.next(rng)
+        started = time.perf_counter()
+        try:
+            if conn is None: conn = http.client.HTTPConnection(host, port, timeout=60, source_address=source)
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            if response.will_close: conn.close(); conn = None
+        except (OSError, http.client.HTTPException):
+            status = 'error'
+            if conn is not None: conn.close(); conn = None
+        results.append((kind, status, time.perf_counter() - started))
+    if conn is not None: conn.close()
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def summarize(samples, elapsed):
+    latencies = [seconds * 1000 for _, _, seconds in samples]
+    statuses = {}
+    for _, status, _ in samples: statuses[str(status)] = statuses.get(str(status), 0) + 1
+    limited = statuses.get('429', 0)
+    errors = sum(n for status, n in statuses.items() if status == 'error' or (status.isdigit() and int(status) >= 400 and status != '429'))
+    total = len(samples)
+    return {
+        'requests': total,
+        'rps': total / elapsed if elapsed else 0.0,
+        'ok_rps': (total - errors - limited) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) if latencies else 0.0,
+        'p90_ms': percentile(latencies, 90) if latencies else 0.0,
+        'p99_ms': percentile(latencies, 99) if latencies else 0.0,
+        'max_ms': max(latencies, default=0.0),
+        'error_rate': errors / total if total else 0.0,
+        'rate_limited': limited,
+        'statuses': statuses,
+    }
+
+def run_step(host, port, scenario, concurrency, duration, source_ips, seed):
+    results = []  # list.append 在 GIL 下是原子的
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(host, port, scenario, deadline, source_ips, seed + i, results)) for i in range(concurrency)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - started
+    by_kind = {}
+    for sample in results: by_kind.setdefault(sample[0], []).append(sample)
+    return {'concurrency': concurrency, 'elapsed_s': elapsed, 'total': summarize(results, elapsed), 'kinds': {kind: summarize(samples, elapsed) for kind, samples in sorted(by_kind.items())}}
+
+def parse_mix(value):
+    mix = []
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in ('page', 'generate'): raise argparse.ArgumentTypeError(f'unknown request kind: {kind}')
+        mix.append((kind, float(weight or 1)))
+    return mix
+
+def parse_ints(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the app under a local multi-worker WSGI server.')
+    parser.add_argument('--url', help='test an already running server (e.g. http://127.0.0.1:3000) instead of starting workers')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='worker processes, one request at a time each (default: all cores)')
+    parser.add_argument('--threaded', action='store_true', help='let each worker handle requests concurrently')
+    parser.add_argument('--concurrency', type=parse_ints, default=[1, 4, 16], help='comma separated client counts, one step each (default: 1,4,16)')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per step (default: 10)')
+    parser.add_argument('--mix', type=parse_mix, default=[('page', 4), ('generate', 1)], help='request weights (default: page=4,generate=1)')
+    parser.add_argument('--langs', default='en,zh,ja,de,es', help='languages for page views')
+    parser.add_argument('--upload-sides', type=parse_ints, default=[64, 512, 2000], help='edge lengths of uploaded PNGs (default: 64,512,2000)')
+    parser.add_argument('--ico-sizes', default='16,32,48', help='icon sizes requested from /generate')
+    parser.add_argument('--repeat-uploads', action='store_true', help='upload identical bytes so the result cache can hit')
+    parser.add_argument('--client-ips', type=int, default=1, help='spread clients over this many loopback source addresses (default: 1)')
+    parser.add_argument('--no-limit', action='store_true', help='disable the rate limiter in the workers')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the request mix')
+    parser.add_argument('--verbose', action='store_true', help='keep worker logs on stderr')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args(argv)
+
+    # 必须在创建任何线程、导入 Pillow 之前 fork
+    pids = []
+    if args.url:
+        target = urlsplit(args.url)
+        host, port = target.hostname, target.port or 80
+    else:
+        if args.no_limit: os.environ['LOADTEST_NO_LIMIT'] = '1'
+        boot = time.perf_counter()
+        sock, pids = start_workers(args.workers, args.threaded, not args.verbose)
+        host, port = sock.getsockname()
+        print(f"started {args.workers} workers in {(time.perf_counter() - boot) * 1000:.0f} ms on {host}:{port}")
+    try:
+        with open(os.path.join(ROOT, 'translations', 'languages.json'), encoding='utf-8') as f: known = json.load(f)
+        langs = [lang for lang in args.langs.split(',') if lang in known]
+        scenario = Scenario(args.mix, langs, make_uploads(args.upload_sides), args.ico_sizes, not args.repeat_uploads)
+        source_ips = [f'127.0.0.{i + 2}' for i in range(args.client_ips)] if args.client_ips > 1 and host.startswith('127.') else None
+        idle = {pid: worker_memory(pid) for pid in pids}
+
+        results = {'workers': args.workers if pids else None, 'threaded': args.threaded, 'mix': dict(args.mix), 'steps': [], 'memory': {}}
+        print(f"\n{'clients':>8}{'req':>8}{'req/s':>9}{'ok/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'errors':>8}{'429':>7}")
+        for i, concurrency in enumerate(args.concurrency):
+            step = run_step(host, port, scenario, concurrency, args.duration, source_ips, args.seed + i * 1000)
+            results['steps'].append(step)
+            t = step['total']
+            print(f"{concurrency:>8}{t['requests']:>8}{t['rps']:>9.1f}{t['ok_rps']:>9.1f}{t['p50_ms']:>9.1f}{t['p90_ms']:>9.1f}{t['p99_ms']:>9.1f}{t['error_rate']:>7.1%}{t['rate_limited']:>7}")
+            for kind, k in step['kinds'].items():
+                print(f"{'  ' + kind:<16}{k['requests']:>8}{k['rps']:>9.1f}{k['ok_rps']:>9.1f}{k['p50_ms']:>9.1f}{k['p90_ms']:>9.1f}{k['p99_ms']:>9.1f}{k['error_rate']:>7.1%}{k['rate_limited']:>7}")
+
+        if pids:
+            print(f"\n{'worker':>8}{'idle MB':>10}{'now MB':>10}{'peak MB':>10}")
+            for pid in pids:
+                now = worker_memory(pid)
+                results['memory'][pid] = {'idle_rss_kb': idle[pid]['rss_kb'], **now}
+                print(f"{pid:>8}{(idle[pid]['rss_kb'] or 0) / 1024:>10.1f}{(now['rss_kb'] or 0) / 1024:>10.1f}{(now['peak_rss_kb'] or 0) / 1024:>10.1f}")
+    finally:
+        stop_workers(pids)
+
+    if args.json:
+        with open(args.json, 'w') as f: json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# 冷启动测量：python tools/measure_startup.py [--runs 5]
+# 每次在全新的解释器中导入 api.index，并记录导入耗时、首个页面请求和首个 /generate 请求的延迟
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import io, json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, ROOT)
+import api.index as ico
+imported = time.perf_counter()
+from PIL import Image
+ico.limiter.enabled = False
+client = ico.app.test_client()
+t = time.perf_counter(); client.get('/en'); first_page = time.perf_counter() - t
+t = time.perf_counter(); client.get('/ja'); other_lang = time.perf_counter() - t
+stream = io.BytesIO(); Image.new('RGBA', (64, 64), (200, 40, 40, 128)).save(stream, 'PNG')
+t = time.perf_counter(); client.post('/generate', data={'file': (io.BytesIO(stream.getvalue()), 'a.png')}, content_type='multipart/form-data'); first_generate = time.perf_counter() - t
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_page_ms': first_page * 1000,
+    'second_lang_ms': other_lang * 1000,
+    'first_generate_ms': first_generate * 1000,
+    'modules': len(sys.modules),
+    'pil_plugins': sorted(m.split('.')[-1] for m in sys.modules if m.startswith('PIL.') and m.endswith('ImagePlugin')),
+}))
+'''
+
+def run_once():
+    out = subprocess.run([sys.executable, '-c', f'ROOT = {ROOT!r}\n' + CHILD], capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure cold-start import and first-request latency.')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to start')
+    args = parser.parse_args(argv)
+    runs = [run_once() for _ in range(args.runs)]
+    for key in ('import_ms', 'first_page_ms', 'second_lang_ms', 'first_generate_ms'):
+        values = [r[key] for r in runs]
+        print(f"{key:<20}median {statistics.median(values):8.1f}   min {min(values):8.1f}   max {max(values):8.1f}")
+    print(f"{'modules':<20}{runs[-1]['modules']}")
+    print(f"{'pil plugins':<20}{', '.join(runs[-1]['pil_plugins'])}")
+
+if __name__ == '__main__':
+    main()